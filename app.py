@@ -1,13 +1,16 @@
 from PyQt5.QtWidgets import QApplication
 from components.video_drag_window import VideoDragDropWindow
 
+def create_window():
+    return VideoDragDropWindow()
+
 def run():
     app = QApplication([])
-    window = VideoDragDropWindow()
+    window = create_window()
     window.show()
     app.exec_()
 
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
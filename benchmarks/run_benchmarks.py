@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+from components.profiler import StageProfiler
+from components.scroll_estimator import row_signature, estimate_row_shift
+from components.segment_parallel import process_video_parallel
+from components.stitcher import LongImageStitcher
+from components.video_engine import VideoEngine
+
+from .synthetic_chat import ChatScenario, generate_chat_video
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = {
+    "steady": ChatScenario("steady", frames=300, speed=8),
+    "pauses": ChatScenario("pauses", frames=400, speed=10, pause_every=20, pause_length=25, seed=1),
+    "back_scroll": ChatScenario("back_scroll", frames=400, speed=9, back_scroll_every=60, back_scroll_distance=300, seed=2),
+    "fast": ChatScenario("fast", frames=240, speed=24, seed=3),
+    "hires": ChatScenario("hires", width=1080, height=2340, top=240, bottom=140, frames=240, speed=16, seed=4),
+}
+
+CONFIGS = {
+    "baseline": {},
+    "signature": {"estimator": "signature"},
+    "signature_gray": {"estimator": "signature", "gray_analysis": True, "analysis_width_scale": 0.25},
+    "sampled": {"adaptive_sampling": True},
+    "signature_sampled": {"estimator": "signature", "adaptive_sampling": True},
+    "dedup": {"dedup": True},  # 界面的默认设置
+    "pipelined": {"pipelined": True},
+    "parallel": {"parallel_chunks": 4},  # process_video_parallel，分块数同时作为进程数
+}
+
+
+def peak_rss_mb():
+    # Linux 上 ru_maxrss 会继承父进程的峰值，优先读取当前进程自己的 VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def run_case(video_path, output_path, scenario, options):
+    # 在独立的子进程中运行，峰值内存只反映这一次运行；各阶段耗时由引擎的 StageProfiler 在同一次运行中统计。
+    # 分块并行时各块在各自的进程中分析，不统计阶段耗时，峰值内存只包括主进程
+    options = dict(options)
+    chunks = options.pop("parallel_chunks", None)
+    sink = LongImageStitcher(output_path, fixed_top_height=scenario.top, fixed_bottom_height=scenario.bottom)
+    profiler = StageProfiler(enabled=not chunks)
+    start = time.perf_counter()
+    if chunks:
+        _, stats = process_video_parallel(video_path, workers=chunks, chunks=chunks, sink=sink,
+                                          fixed_top_height=scenario.top, fixed_bottom_height=scenario.bottom, **options)
+    else:
+        engine = VideoEngine(video_path, fixed_top_height=scenario.top, fixed_bottom_height=scenario.bottom,
+                             profiler=profiler, **options)
+        engine.process(sink)
+        stats = engine.stats
+    wall = time.perf_counter() - start
+    frames = stats["frames_grabbed"]
+    profile = profiler.summary()
+    stage_time = {name: stage["total_time"] for name, stage in profile["stages"].items()}
+    return {
+        "frames": frames,
+        "frames_analyzed": stats["frames_read"],
+        "backtracks": stats.get("backtracks", 0),
+        "regrabs": stats.get("regrabs", 0),
+        "frames_kept": stats["frames_kept"],
+        "wall_time": wall,
+        "fps": frames / wall if wall > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        # analyze 包含 prepare、shift_estimate 等子阶段，子阶段的明细在 profile 中
+        "stages": {
+            "decode": stage_time.get("decode", 0.0),
+            "analyze": stage_time.get("analyze", 0.0),
+            "stitch": stage_time.get("sink", 0.0) + stage_time.get("sink_close", 0.0),
+        },
+        "profile": profile,
+    }
+
+
+def measure_accuracy(stitched_path, truth, top, bottom, block=64, bands=4, min_std=2.0, max_error=4.0):
+    # 把拼接结果按 block 行切块，在真实对话图像中定位每块，由相邻块的位置差统计重复与缺失的行数
+    image = cv2.imread(stitched_path)
+    if image is None:
+        return None
+    content = image[top:image.shape[0] - bottom]
+    truth_signature = row_signature(truth, bands)
+    content_signature = row_signature(content, bands)
+    window = 2 * block + (len(truth) // 20)
+    positions = []
+    unmatched = 0
+    for row in range(0, len(content) - block + 1, block):
+        block_signature = content_signature[row:row + block]
+        if block_signature.std() < min_std:
+            continue  # 空白块无法唯一定位
+        guess = positions[-1][1] + row - positions[-1][0] if positions else row
+        if guess + block <= len(truth):
+            residual = truth_signature[guess:guess + block] - block_signature
+            if np.sqrt(np.mean(residual * residual)) <= max_error:
+                positions.append((row, guess))  # 与上一块连续，不必搜索（重复的气泡会让搜索认错位置）
+                continue
+        low = max(0, guess - window)
+        high = min(len(truth), guess + block + window)
+        shift = estimate_row_shift(truth_signature[low:high], block_signature, min_overlap=block, max_error=max_error)
+        if shift is None or shift < 0 or shift + block > high - low:
+            low, high = 0, len(truth)
+            shift = estimate_row_shift(truth_signature, block_signature, min_overlap=block, max_error=max_error)
+        if shift is None or shift < 0:
+            unmatched += 1
+            continue
+        positions.append((row, low + shift))
+
+    duplicated = 0
+    missing = 0
+    if positions:
+        anchors = [(0, 0)] + positions + [(len(content), len(truth))]
+        for (row_a, truth_a), (row_b, truth_b) in zip(anchors, anchors[1:]):
+            delta = (truth_b - truth_a) - (row_b - row_a)
+            if delta > 0:
+                missing += delta
+            else:
+                duplicated -= delta
+    return {
+        "stitched_content_height": len(content),
+        "truth_content_height": len(truth),
+        "height_error": len(content) - len(truth),
+        "duplicated_rows": int(duplicated),
+        "missing_rows": int(missing),
+        "matched_blocks": len(positions),
+        "unmatched_blocks": unmatched,
+    }
+
+
+def run_benchmarks(scenario_names, config_names, work_dir):
+    results = []
+    for scenario_name in scenario_names:
+        scenario = SCENARIOS[scenario_name]
+        video_path = os.path.join(work_dir, f"{scenario.name}.{'avi' if scenario.codec == 'MJPG' else 'mp4'}")
+        truth = generate_chat_video(video_path, scenario)
+        for config_name in config_names:
+            output_path = os.path.join(work_dir, f"{scenario.name}_{config_name}.png")
+            # 每次运行都用新的子进程，保证峰值内存互不影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(run_case, video_path, output_path, scenario, CONFIGS[config_name]).result()
+            result["scenario"] = scenario.name
+            result["config"] = config_name
+            result["accuracy"] = measure_accuracy(output_path, truth["canvas"], scenario.top, scenario.bottom)
+            results.append(result)
+            accuracy = result["accuracy"] or {}
+            print(f"{scenario.name:<12} {config_name:<18} {result['fps']:8.1f} frames/s  "
+                  f"rss {result['peak_rss_mb'] or 0:7.1f} MB  "
+                  f"dup {accuracy.get('duplicated_rows', '-'):>5}  missing {accuracy.get('missing_rows', '-'):>5}")
+    return results
+
+
+def check_accuracy(results, max_row_errors):
+    # 与合成视频的真实对话图像比较，重复或缺失的行数超过上限即失败
+    failures = []
+    for result in results:
+        accuracy = result.get("accuracy")
+        if accuracy is None:
+            failures.append(f"{result['scenario']}/{result['config']}: no stitched image")
+            continue
+        for key in ("duplicated_rows", "missing_rows"):
+            if accuracy[key] > max_row_errors:
+                failures.append(f"{result['scenario']}/{result['config']}: {key} {accuracy[key]} > {max_row_errors}")
+    return failures
+
+
+def compare_with_baseline(results, baseline_results, max_fps_drop):
+    # 与之前保存的结果比较：速度下降超过阈值或重复/缺失行变多都算回归
+    previous = {(r["scenario"], r["config"]): r for r in baseline_results}
+    regressions = []
+    for result in results:
+        old = previous.get((result["scenario"], result["config"]))
+        if old is None:
+            continue
+        if result["fps"] < old["fps"] * (1 - max_fps_drop):
+            regressions.append(f"{result['scenario']}/{result['config']}: {old['fps']:.1f} -> {result['fps']:.1f} frames/s")
+        for key in ("duplicated_rows", "missing_rows"):
+            old_value = (old.get("accuracy") or {}).get(key, 0)
+            new_value = (result.get("accuracy") or {}).get(key, 0)
+            if new_value > old_value:
+                regressions.append(f"{result['scenario']}/{result['config']}: {key} {old_value} -> {new_value}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmarks",
+                                     description="Benchmark the video engine on synthetic WeChat-style recordings.")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=sorted(CONFIGS))
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to check for regressions")
+    parser.add_argument("--max-fps-drop", type=float, default=0.15,
+                        help="allowed relative frames/s drop before a run counts as a regression (default: 0.15)")
+    parser.add_argument("--max-row-errors", type=int, default=None, metavar="ROWS",
+                        help="fail when any run duplicates or misses more rows than this against the ground truth")
+    parser.add_argument("--work-dir", default=None, help="keep generated videos and stitched images here")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        results = run_benchmarks(args.scenarios, args.configs, work_dir)
+
+    report = {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "scenarios": {name: SCENARIOS[name].as_dict() for name in args.scenarios},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    failures = []
+    if args.max_row_errors is not None:
+        failures.extend(check_accuracy(results, args.max_row_errors))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures.extend(compare_with_baseline(results, json.load(f)["results"], args.max_fps_drop))
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
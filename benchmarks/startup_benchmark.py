@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("cv2", "numpy", "PIL")
+
+# 在新的解释器中运行：从启动到窗口显示（show() 后处理一次事件）的各阶段耗时，以及显示时已经导入了哪些重量级模块。
+# 最后单独计时第一次处理前需要导入的模块（拖入文件后在后台导入）
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+qt_imported = time.perf_counter()
+qt_app = QApplication([])
+import app
+app_imported = time.perf_counter()
+window = app.create_window()
+window.show()
+qt_app.processEvents()
+shown = time.perf_counter()
+heavy = [name for name in {heavy!r} if name in sys.modules]
+from components import video_process_thread, image_viewer
+processing_imported = time.perf_counter()
+print(json.dumps({{
+    "qt_import": qt_imported - start,
+    "app_import": app_imported - qt_imported,
+    "window_show": shown - app_imported,
+    "in_process_to_window": shown - start,
+    "processing_import": processing_imported - shown,
+    "heavy_modules_at_show": heavy,
+}}))
+"""
+
+
+def measure_once(env):
+    # 总耗时从启动子进程算起，包含解释器本身的启动
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)], cwd=ROOT, env=env,
+                               capture_output=True, text=True)
+    total = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_total"] = total
+    return result
+
+
+def run_startup_benchmark(runs=10, offscreen=True):
+    env = dict(os.environ)
+    if offscreen:
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    measure_once(env)  # 预热：写入 .pyc、操作系统文件缓存
+    samples = [measure_once(env) for _ in range(runs)]
+    timings = {}
+    for name in ("process_total", "in_process_to_window", "qt_import", "app_import", "window_show", "processing_import"):
+        values = [sample[name] for sample in samples]
+        timings[name] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+    return {
+        "runs": runs,
+        "timings": timings,
+        "heavy_modules_at_show": samples[-1]["heavy_modules_at_show"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup_benchmark",
+                                     description="Measure how long the GUI takes to show its first window.")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="number of measured launches (default: 10)")
+    parser.add_argument("--on-screen", action="store_true", help="use the real display instead of QT_QPA_PLATFORM=offscreen")
+    parser.add_argument("-o", "--output", default=None, help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_startup_benchmark(args.runs, offscreen=not args.on_screen)
+    report.update({"python": platform.python_version(), "machine": platform.machine()})
+    for name, timing in report["timings"].items():
+        print(f"{name:<22} median {timing['median'] * 1000:8.1f} ms  (min {timing['min'] * 1000:.1f}, "
+              f"max {timing['max'] * 1000:.1f})")
+    heavy = report["heavy_modules_at_show"]
+    print(f"heavy modules loaded before the window showed: {', '.join(heavy) if heavy else 'none'}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
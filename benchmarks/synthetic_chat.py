@@ -0,0 +1,117 @@
+import random
+
+import cv2
+import numpy as np
+
+
+# 生成类似微信聊天录屏的合成视频，并返回真实的行布局，用于评估速度与拼接准确度
+class ChatScenario:
+    def __init__(self, name, width=540, height=960, top=120, bottom=70, frames=300, fps=30, speed=8,
+                 pause_every=0, pause_length=0, back_scroll_every=0, back_scroll_distance=0, seed=0, codec="mp4v"):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.top = top  # 顶部固定区域高度
+        self.bottom = bottom  # 底部固定区域高度
+        self.frames = frames
+        self.fps = fps
+        self.speed = speed  # 每帧滚动的像素数
+        self.pause_every = pause_every  # 每滚动多少帧停顿一次，0 表示不停顿
+        self.pause_length = pause_length
+        self.back_scroll_every = back_scroll_every  # 每滚动多少帧向回滚动一次，0 表示不回滚
+        self.back_scroll_distance = back_scroll_distance
+        self.seed = seed
+        self.codec = codec
+
+    @property
+    def content_height(self):
+        return self.height - self.top - self.bottom
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def scroll_offsets(scenario):
+    # 每帧内容区在整段对话中的起始行
+    offsets = []
+    offset = 0
+    scrolled = 0
+    pause_left = 0
+    back_left = 0
+    while len(offsets) < scenario.frames:
+        offsets.append(offset)
+        if pause_left > 0:
+            pause_left -= 1
+            continue
+        if back_left > 0:
+            step = min(scenario.speed, back_left, offset)
+            offset -= step
+            back_left = back_left - step if step > 0 else 0
+            continue
+        offset += scenario.speed
+        scrolled += 1
+        if scenario.pause_every and scrolled % scenario.pause_every == 0:
+            pause_left = scenario.pause_length
+        if scenario.back_scroll_every and scrolled % scenario.back_scroll_every == 0:
+            back_left = scenario.back_scroll_distance
+    return offsets
+
+
+def render_conversation(scenario, total_height):
+    rnd = random.Random(scenario.seed)
+    width = scenario.width
+    canvas = np.full((total_height, width, 3), 237, np.uint8)
+    bubbles = []
+    font_scale = width / 900
+    line_height = max(16, int(46 * font_scale))
+    y = 12
+    while y < total_height:
+        lines = rnd.randint(1, 4)
+        bubble_height = lines * line_height + line_height // 2
+        left = rnd.random() < 0.5
+        bubble_width = rnd.randint(width // 3, width * 2 // 3)
+        x0 = width // 12 if left else width - width // 12 - bubble_width
+        color = (255, 255, 255) if left else (120, 232, 149)
+        cv2.rectangle(canvas, (x0, y), (x0 + bubble_width, y + bubble_height), color, -1)
+        avatar = rnd.randint(60, 200)
+        ax = 4 if left else width - width // 12 + 4
+        cv2.rectangle(canvas, (ax, y), (ax + width // 12 - 8, y + width // 12 - 8), (avatar, 120, 255 - avatar), -1)
+        for line in range(lines):
+            text = "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz   ") for _ in range(max(4, bubble_width // max(1, int(20 * font_scale)))))
+            cv2.putText(canvas, text, (x0 + 10, y + (line + 1) * line_height), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale, (20, 20, 20), max(1, int(2 * font_scale)), cv2.LINE_AA)
+        bubbles.append((y, bubble_height, "left" if left else "right"))
+        y += bubble_height + rnd.randint(line_height // 2, line_height * 2)
+    return canvas, bubbles
+
+
+def render_frame(scenario, canvas, offset):
+    frame = np.empty((scenario.height, scenario.width, 3), np.uint8)
+    frame[:scenario.top] = (247, 247, 247)
+    cv2.putText(frame, "Chat", (scenario.width // 2 - 40, scenario.top * 2 // 3), cv2.FONT_HERSHEY_SIMPLEX,
+                scenario.width / 700, (0, 0, 0), 2, cv2.LINE_AA)
+    frame[scenario.top:scenario.height - scenario.bottom] = canvas[offset:offset + scenario.content_height]
+    frame[scenario.height - scenario.bottom:] = (246, 246, 246)
+    cv2.rectangle(frame, (scenario.width // 10, scenario.height - scenario.bottom + 12),
+                  (scenario.width * 8 // 10, scenario.height - 12), (255, 255, 255), -1)
+    return frame
+
+
+def generate_chat_video(path, scenario):
+    # 写出视频并返回真实数据：整段对话图像、每帧偏移、气泡布局以及理想拼接结果的内容高度
+    offsets = scroll_offsets(scenario)
+    truth_height = max(offsets) + scenario.content_height
+    canvas, bubbles = render_conversation(scenario, truth_height)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*scenario.codec), scenario.fps,
+                             (scenario.width, scenario.height))
+    if not writer.isOpened():
+        raise IOError(f"Cannot open video writer for {path}")
+    for offset in offsets:
+        writer.write(render_frame(scenario, canvas, offset))
+    writer.release()
+    return {
+        "canvas": canvas,
+        "offsets": offsets,
+        "bubbles": [bubble for bubble in bubbles if bubble[0] < truth_height],
+        "content_height": truth_height,
+    }
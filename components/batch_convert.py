@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .calibration import DeviceProfileStore, calibrate_video
+from .profiler import StageProfiler, format_summary
+from .result_cache import ResultCache, cached_process
+from .segment_parallel import process_video_parallel
+from .segment_sinks import DiskSpillSink, TeeSink
+from .stitcher import LongImageStitcher
+from .video_engine import VideoEngine
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".avi", ".mkv", ".3gp"}
+
+
+def collect_videos(inputs):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path) and os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                    videos.append(full_path)
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Skipping missing input: {path}", file=sys.stderr)
+    return videos
+
+
+def engine_options(options, stem):
+    # 命令行参数 -> VideoEngine 参数
+    return {
+        "fixed_top_height": options["top"],
+        "fixed_bottom_height": options["bottom"],
+        "estimator": options["estimator"],
+        "gray_analysis": options["gray_scale"] is not None,
+        "analysis_width_scale": options["gray_scale"] or 1.0,
+        "adaptive_sampling": options["sample"],
+        "max_stride": options["max_stride"],
+        "pipelined": options["pipeline"],
+        "dedup": options["dedup"],
+        "debug_output_dir": os.path.join(options["debug_dir"], stem) if options["debug_dir"] else None,
+        "debug_mode": options["debug_mode"],
+        "debug_every_n": options["debug_every"],
+    }
+
+
+def create_sink(output_dir, stem, options):
+    # 长图（或分页图）总是流式拼接；--segments 时同时把每段写入磁盘
+    stitcher = LongImageStitcher(os.path.join(output_dir, f"{stem}.png"),
+                                 fixed_top_height=options["top"], fixed_bottom_height=options["bottom"],
+                                 page_height=options["pages"])
+    if not options["segments"]:
+        return stitcher
+    return TeeSink(stitcher, DiskSpillSink(os.path.join(output_dir, stem)))
+
+
+def flatten_outputs(result):
+    if result and isinstance(result[0], list):
+        return [path for paths in result for path in paths]
+    return result
+
+
+def calibrated_options(video_path, options):
+    # --calibrate 时用检测到的标题栏/输入栏高度替换 --top/--bottom
+    if not options["calibrate"]:
+        return options, None
+    profile = calibrate_video(video_path, DeviceProfileStore(options["device_profiles"]))
+    if profile is None:
+        return options, None
+    return dict(options, top=profile["fixed_top_height"], bottom=profile["fixed_bottom_height"]), profile
+
+
+def convert_one(video_path, output_dir, options):
+    # 在子进程中运行：每个进程处理一个视频
+    wall_start = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    options, calibration = calibrated_options(video_path, options)
+    profiler = None
+    if options["profile"] or options["trace_dir"]:
+        profiler = StageProfiler(trace=bool(options["trace_dir"]))
+    engine = VideoEngine(video_path, profiler=profiler, **engine_options(options, stem))
+    sink = create_sink(output_dir, stem, options)
+    if options["cache_dir"]:
+        outputs = cached_process(engine, ResultCache(options["cache_dir"], options["cache_size"] * 1024 * 1024), sink,
+                                 store_segments=options["cache_segments"])
+    else:
+        outputs = engine.process(sink)
+    outputs = flatten_outputs(outputs)
+
+    result = dict(engine.stats)
+    result["video"] = video_path
+    result["outputs"] = outputs
+    result["calibration"] = calibration
+    result["wall_time"] = time.perf_counter() - wall_start
+    if options["trace_dir"]:
+        os.makedirs(options["trace_dir"], exist_ok=True)
+        result["trace"] = os.path.join(options["trace_dir"], f"{stem}.trace.json")
+        profiler.write_chrome_trace(result["trace"])
+    return result
+
+
+def convert_one_parallel(video_path, output_dir, options):
+    # 单个视频按帧区间分块，由多个进程并行处理
+    wall_start = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    options, calibration = calibrated_options(video_path, options)
+    parallel_options = engine_options(options, stem)
+    # 各块独立分析，去重索引无法跨块共享，分块模式下不去重
+    for option in ("adaptive_sampling", "pipelined", "debug_output_dir", "max_stride", "debug_mode", "debug_every_n", "dedup"):
+        parallel_options.pop(option)
+    outputs, stats = process_video_parallel(video_path, workers=max(1, options["workers"]), chunks=options["chunks"],
+                                            sink=create_sink(output_dir, stem, options), **parallel_options)
+
+    result = dict(stats)
+    result["video"] = video_path
+    result["outputs"] = flatten_outputs(outputs)
+    result["calibration"] = calibration
+    result["wall_time"] = time.perf_counter() - wall_start
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m components.batch_convert",
+                                     description="Convert WeChat screen recordings to chat images without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="video files or directories containing videos")
+    parser.add_argument("-o", "--output-dir", default="output", help="directory for stitched images (default: output)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--top", type=int, default=120, help="fixed top area height in pixels")
+    parser.add_argument("--bottom", type=int, default=70, help="fixed bottom area height in pixels")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="detect the fixed top/bottom heights per video (cached per device); "
+                             "--top/--bottom are used when detection fails")
+    parser.add_argument("--device-profiles", default=None, metavar="PATH",
+                        help="calibration cache file (default: ~/.wxv2p/device_profiles.json)")
+    parser.add_argument("--segments", action="store_true", help="also write every kept segment as its own PNG")
+    parser.add_argument("--sample", action="store_true",
+                        help="skip frames adaptively based on scroll velocity instead of analyzing every frame")
+    parser.add_argument("--estimator", choices=("diff", "signature"), default="diff",
+                        help="new-content estimator: per-pixel diff (default) or row-signature matching")
+    parser.add_argument("--dedup", action="store_true",
+                        help="skip frames whose content was already captured (scrolling back up and down again); "
+                             "not used with --chunks")
+    parser.add_argument("--gray-scale", type=float, default=None, metavar="FACTOR",
+                        help="analyze a grayscale copy with its width scaled by FACTOR (e.g. 0.25); "
+                             "crops are still taken from the full-resolution frame")
+    parser.add_argument("--debug-dir", default=None,
+                        help="write annotated debug frames under this directory (off by default)")
+    parser.add_argument("--debug-mode", choices=("off", "every_n", "kept"), default="kept",
+                        help="which frames get a debug image when --debug-dir is set (default: kept)")
+    parser.add_argument("--debug-every", type=int, default=10, help="frame interval for --debug-mode every_n")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run decode, analysis and segment output on separate threads")
+    parser.add_argument("--chunks", type=int, default=1,
+                        help="split each video into this many frame ranges processed by --workers processes; "
+                             "videos are then converted one after another (default: 1, one video per worker)")
+    parser.add_argument("--pages", type=int, default=None, metavar="HEIGHT",
+                        help="write the long image as pages of HEIGHT pixels instead of one tall PNG")
+    parser.add_argument("--max-stride", type=int, default=8, help="largest frame stride used by --sample (default: 8)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="reuse kept-segment positions of videos converted before with the same parameters "
+                             "(not used with --chunks)")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar="MB",
+                        help="evict least recently used cache entries above this size (default: 1024)")
+    parser.add_argument("--cache-segments", action="store_true",
+                        help="also store every segment as PNG in the cache so hits do not need the source video")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each processing stage and print a per-video profile (not used with --chunks)")
+    parser.add_argument("--trace-dir", default=None,
+                        help="write a Chrome trace-event file per video into this directory (implies --profile)")
+    parser.add_argument("--stats-json", default=None, metavar="PATH",
+                        help="write the statistics of every converted video to PATH as JSON")
+    return parser.parse_args(argv)
+
+
+def iter_results(args, videos):
+    # 逐个产出 (video, result, error)
+    if args.chunks > 1:
+        # 单视频分块并行：视频依次处理，每个视频占用全部 worker
+        for video in videos:
+            try:
+                yield video, convert_one_parallel(video, args.output_dir, vars(args)), None
+            except Exception as exc:
+                yield video, None, exc
+        return
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(convert_one, video, args.output_dir, vars(args)): video
+            for video in videos
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as exc:
+                yield futures[future], None, exc
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("No videos found.", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    batch_start = time.perf_counter()
+    failures = 0
+    total_frames = 0
+    results = []
+    for video, result, error in iter_results(args, videos):
+        if error is not None:
+            failures += 1
+            print(f"{video}: FAILED ({error})", file=sys.stderr)
+            results.append({"video": video, "error": str(error)})
+            continue
+        results.append(result)
+        total_frames += result["frames_grabbed"]
+        if "chunks" in result:
+            detail = f"in {result['chunks']} chunks ({result['seam_frames']} re-analyzed at seams)"
+        else:
+            detail = f"({result['frames_read']} analyzed)"
+            if result.get("backtracks"):
+                detail += f", {result['backtracks']} backtracks ({result['regrabs']} frames re-grabbed)"
+        if result.get("cache"):
+            detail += f", cache {result['cache']}"
+        if result.get("calibration"):
+            calibration = result["calibration"]
+            detail += (f", top/bottom {calibration['fixed_top_height']}/{calibration['fixed_bottom_height']} "
+                       f"({calibration['source']})")
+        print(f"{video}: {result['frames_grabbed']} frames {detail}, "
+              f"{result['fps']:.1f} frames/s, {result['frames_kept']} segments, wall {result['wall_time']:.2f}s")
+        for stage, stats in result.get("pipeline", {}).items():
+            print(f"    {stage:<8} busy {stats['busy_time']:.2f}s, blocked {stats['blocked_time']:.2f}s, "
+                  f"starved {stats['starved_time']:.2f}s, queue depth max {stats['max_queue_depth']} "
+                  f"mean {stats['mean_queue_depth']:.1f}")
+        if "profile" in result:
+            print(format_summary(result["profile"]))
+
+    batch_elapsed = time.perf_counter() - batch_start
+    print(f"Done: {len(videos) - failures}/{len(videos)} videos, {total_frames} frames in {batch_elapsed:.2f}s "
+          f"({total_frames / batch_elapsed if batch_elapsed > 0 else 0.0:.1f} frames/s overall)")
+    if args.stats_json:
+        with open(args.stats_json, "w", encoding="utf-8") as f:
+            json.dump({"elapsed": batch_elapsed, "videos": results}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
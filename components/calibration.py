@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".wxv2p", "device_profiles.json")
+
+
+def sample_frames(cap, total_frames, count=12):
+    # 在整个视频中均匀取 count 帧，用 grab/retrieve 只解码需要的帧
+    if total_frames <= 0:
+        return []
+    indices = sorted(set(np.linspace(0, total_frames - 1, min(count, total_frames)).astype(int).tolist()))
+    frames = []
+    for index in indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        if cap.grab():
+            ret, frame = cap.retrieve()
+            if ret:
+                frames.append(frame)
+    return frames
+
+
+def ui_signature(frame, strip_ratio=0.05, levels=16):
+    # 顶部和底部窄条中每行的中位亮度（不受标题文字、时间等少量像素影响）量化后取哈希，
+    # 用来区分同一分辨率下的不同机型、主题（深色/浅色模式）
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    strip = max(1, int(gray.shape[0] * strip_ratio))
+    rows = np.concatenate([np.median(gray[:strip], axis=1), np.median(gray[-strip:], axis=1)])
+    quantized = (rows // (256 // levels)).astype(np.uint8)
+    return hashlib.sha1(quantized.tobytes()).hexdigest()[:12]
+
+
+def profile_key(frame):
+    height, width = frame.shape[:2]
+    return f"{width}x{height}-{ui_signature(frame)}"
+
+
+def detect_static_bands(frames, pixel_threshold=25.0, changed_ratio=0.02, column_step=4, min_content_ratio=0.3,
+                        min_band=1):
+    # 逐像素计算采样帧之间的时间方差，某行中变化的像素超过 changed_ratio 即视为滚动区域；
+    # 从顶部和底部向内连续静止的行就是固定的标题栏和输入栏。返回 (top, bottom)，无法判断时返回 None。
+    # 没有输入栏等情况下检测到的高度为 0，至少取 min_band 行：少算进内容区的一行会由下一帧带上
+    if len(frames) < 3:
+        return None
+    stack = np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)[:, ::column_step] for frame in frames]).astype(np.float32)
+    variance = stack.var(axis=0)
+    dynamic = (variance > pixel_threshold).mean(axis=1) > changed_ratio
+    dynamic_rows = np.flatnonzero(dynamic)
+    height = stack.shape[1]
+    if len(dynamic_rows) == 0:
+        return None  # 画面没有滚动，无法区分固定区域
+    top = max(min_band, int(dynamic_rows[0]))
+    bottom = max(min_band, int(height - 1 - dynamic_rows[-1]))
+    if height - top - bottom < height * min_content_ratio:
+        return None
+    return top, bottom
+
+
+# 按分辨率和界面特征保存标定结果的小型 JSON 文件
+class DeviceProfileStore:
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_PROFILE_PATH
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        return self.load().get(key)
+
+    def put(self, key, profile):
+        # 写入前重新读取，减少多个进程同时写入时互相覆盖；先写临时文件再替换，保证文件完整
+        with self.lock:
+            profiles = self.load()
+            profiles[key] = profile
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(profiles, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+
+def calibrate_video(video_path, store=None, samples=12, force=False):
+    # 返回 {"fixed_top_height", "fixed_bottom_height", "key", "source"}；
+    # source 为 "cache"（同一设备已标定过）或 "calibrated"，无法标定时返回 None
+    cap = cv2.VideoCapture(video_path)
+    try:
+        ret, first_frame = cap.read()
+        if not ret:
+            return None
+        key = profile_key(first_frame)
+        if store is not None and not force:
+            cached = store.get(key)
+            # 旧版本可能保存了高度为 0 的结果，重新标定
+            if cached is not None and min(cached["fixed_top_height"], cached["fixed_bottom_height"]) > 0:
+                return dict(cached, key=key, source="cache")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        bands = detect_static_bands(sample_frames(cap, total_frames, samples))
+    finally:
+        cap.release()
+    if bands is None:
+        return None
+    profile = {"fixed_top_height": bands[0], "fixed_bottom_height": bands[1]}
+    if store is not None:
+        store.put(key, profile)
+    return dict(profile, key=key, source="calibrated")
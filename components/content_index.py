@@ -0,0 +1,159 @@
+from collections import Counter
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+HASH_GROUPS = 8  # 每块按行分成 8 组
+HASH_COLUMNS = 9  # 每组缩成 9 列，相邻列比较得到 8 位，共 64 位
+THUMB_COLUMNS = HASH_COLUMNS * 4
+HASH_THRESHOLD = 2.0  # 右侧一列比左侧亮超过该灰度值时该位为 1，平坦区域稳定为 0，不会被噪声翻转
+
+
+def reduce_rows(rows):
+    # 每行缩成 THUMB_COLUMNS 列的灰度，聊天内容按行排列，宽度方向可以大幅缩小
+    gray = cv2.cvtColor(rows, cv2.COLOR_BGR2GRAY) if rows.ndim == 3 else rows
+    return cv2.resize(gray, (THUMB_COLUMNS, gray.shape[0]), interpolation=cv2.INTER_AREA)
+
+
+def block_hashes(thumbs, block, offsets):
+    # 对从 offsets 各行开始的 block 行计算 64 位差值哈希（dHash），用累加和一次算出所有位置；
+    # 同时返回每一位的置信度（差值离阈值的距离），离阈值近的位容易被压缩噪声翻转
+    columns = thumbs.reshape(len(thumbs), HASH_COLUMNS, -1).mean(axis=2, dtype=np.float64)
+    group = block // HASH_GROUPS
+    cumulative = np.concatenate((np.zeros((1, HASH_COLUMNS)), np.cumsum(columns, axis=0)))
+    group_means = (cumulative[group:] - cumulative[:-group]) / group
+    grouped = group_means[offsets[:, None] + np.arange(HASH_GROUPS) * group]
+    differences = (grouped[:, :, 1:] - grouped[:, :, :-1]).reshape(len(offsets), 64) - HASH_THRESHOLD
+    values = np.packbits(differences > 0, axis=1).view(">u8").ravel()
+    return values, np.abs(differences)
+
+
+# 已保留内容的索引。保留过的内容按对齐关系放进同一个行坐标系（相当于拼出的长图），
+# 坐标系中每一行起始的 block 行有一个 64 位感知哈希，存在 哈希 -> 行号 的字典中。
+# 查询时把一屏内容按 block 平铺切块，每块查字典（对最不可靠的几位做多探针查找以容忍噪声），
+# 由多数块认可的位移给出这一屏在坐标系中的位置，再逐行比较行签名确认内容确实相同
+class ContentIndex:
+    def __init__(self, block=32, probe_bits=6, max_flips=2, min_std=6.0, max_error=4.0, max_uncovered_rows=4,
+                 signature_bands=4):
+        self.block = block
+        self.probe_bits = probe_bits  # 参与多探针查找的低置信度位数
+        self.max_flips = max_flips  # 每次探针最多翻转的位数
+        self.min_std = min_std  # 低于该标准差的行视为空白，不参与判断
+        self.max_error = max_error  # 行签名的均方根误差上限
+        self.max_uncovered_rows = max_uncovered_rows  # 容许的未覆盖行数，远小于一行文字的高度
+        self.signature_bands = signature_bands  # 行签名由缩略图按列分成的条带均值得到，需能整除 THUMB_COLUMNS
+        self.hashes = {}
+        self.signature = np.empty((0, signature_bands), np.float32)  # 坐标系中每一行的行签名，空隙为 NaN
+        self.indexed = np.empty(0, bool)
+        # 探针矩阵：每行表示翻转哪些低置信度位
+        probes = [()] + [flips for count in range(1, max_flips + 1) for flips in combinations(range(probe_bits), count)]
+        self.probes = np.zeros((len(probes), probe_bits), bool)
+        for row, flips in enumerate(probes):
+            self.probes[row, list(flips)] = True
+        self.last_rows = None
+        self.last_located = None
+        self.unmatched_rows = 0  # 上一次 covers() 中与坐标系不一致的行数（包括空白行）
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def prepare(self, rows):
+        thumbs = reduce_rows(rows)
+        informative = thumbs.std(axis=1) > self.min_std
+        signature = thumbs.reshape(len(thumbs), self.signature_bands, -1).mean(axis=2, dtype=np.float32)
+        return thumbs, informative, signature
+
+    def useful_blocks(self, informative, offsets):
+        # 块中至少四分之一的行有内容才参与索引和查询，空白块到处都能匹配
+        cumulative = np.concatenate(([0], np.cumsum(informative)))
+        return (cumulative[offsets + self.block] - cumulative[offsets]) * 4 >= self.block
+
+    def lookup(self, value, margins):
+        # 翻转置信度最低的若干位组合出多个探针分别查找，返回所有命中的行号
+        weak = np.argpartition(margins, self.probe_bits)[:self.probe_bits]
+        masks = np.uint64(1) << (np.uint64(63) - weak.astype(np.uint64))
+        flips = np.bitwise_xor.reduce(np.where(self.probes, masks, np.uint64(0)), axis=1)
+        positions = []
+        for probe in (np.uint64(value) ^ flips).tolist():
+            positions.extend(self.hashes.get(probe, ()))
+        return positions
+
+    def candidate_shifts(self, thumbs, informative):
+        # 平铺查询，按票数返回候选位移（坐标系行号减去当前行号）
+        votes = Counter()
+        if not self.hashes or len(thumbs) < self.block:
+            return []
+        offsets = np.unique(np.append(np.arange(0, len(thumbs) - self.block + 1, self.block), len(thumbs) - self.block))
+        offsets = offsets[self.useful_blocks(informative, offsets)]
+        values, margins = block_hashes(thumbs, self.block, offsets)
+        for offset, value, margin in zip(offsets, values, margins):
+            for shift in {position - int(offset) for position in self.lookup(int(value), margin)}:
+                votes[shift] += 1
+        return [shift for shift, _ in votes.most_common(3)]
+
+    def matching_rows(self, signature, shift):
+        # 在位移 shift 处逐行比较行签名，返回每行是否与坐标系中的内容一致
+        start, end = max(0, shift), min(len(self.signature), shift + len(signature))
+        matched = np.zeros(len(signature), bool)
+        if start >= end:
+            return matched
+        error = np.sqrt(np.mean((self.signature[start:end] - signature[start - shift:end - shift]) ** 2, axis=1))
+        matched[start - shift:end - shift] = error <= self.max_error  # NaN 比较结果为 False
+        return matched
+
+    def locate(self, rows):
+        # 返回 (缩略图, 有内容的行, 行签名, 位移, 与坐标系一致的行)，找不到时位移为 None；
+        # covers() 之后紧接着对同一帧调用 add() 时复用结果
+        if rows is self.last_rows:
+            return self.last_located
+        thumbs, informative, signature = self.prepare(rows)
+        shift, matched = self.best_shift(thumbs, informative, signature)
+        self.last_rows = rows
+        self.last_located = thumbs, informative, signature, shift, matched
+        return self.last_located
+
+    def best_shift(self, thumbs, informative, signature):
+        best_shift, best_matched, best_count = None, None, 0
+        for shift in self.candidate_shifts(thumbs, informative):
+            matched = self.matching_rows(signature, shift)
+            count = np.count_nonzero(matched & informative)
+            if count > best_count:
+                best_shift, best_matched, best_count = shift, matched, count
+        return best_shift, best_matched
+
+    def covers(self, rows):
+        # rows（一屏内容区）中有内容的行是否都已经保留过
+        thumbs, informative, signature, shift, matched = self.locate(rows)
+        if shift is None or not informative.any():
+            self.unmatched_rows = len(rows)
+            return False
+        self.unmatched_rows = int(np.count_nonzero(~matched))
+        return np.count_nonzero(informative & ~matched) <= self.max_uncovered_rows
+
+    def add(self, rows):
+        # 把保留的一屏内容加入坐标系：能对齐时放在对齐的位置，否则另起一段；只索引坐标系中新增的行
+        if len(rows) < self.block:
+            return
+        thumbs, informative, signature, shift, matched = self.locate(rows)
+        self.last_rows = self.last_located = None  # 加入后坐标系已变化
+        if shift is None or np.count_nonzero(matched & informative) < self.block:
+            shift = len(self.signature) + self.block  # 与已有内容隔开，块不会跨越两段
+        end = shift + len(signature)
+        if end > len(self.signature):
+            grow = end - len(self.signature)
+            self.signature = np.concatenate((self.signature, np.full((grow, self.signature_bands), np.nan, np.float32)))
+            self.indexed = np.concatenate((self.indexed, np.zeros(grow, bool)))
+        start = max(0, shift)
+        new_rows = np.isnan(self.signature[start:end, 0])
+        self.signature[start:end][new_rows] = signature[start - shift:end - shift][new_rows]
+
+        offsets = np.arange(len(thumbs) - self.block + 1)
+        offsets = offsets[(offsets + shift >= 0) & ~self.indexed[np.clip(offsets + shift, 0, None)]]
+        if len(offsets) == 0:
+            return
+        self.indexed[offsets + shift] = True
+        offsets = offsets[self.useful_blocks(informative, offsets)]
+        values, _ = block_hashes(thumbs, self.block, offsets)
+        for offset, value in zip(offsets.tolist(), values.tolist()):
+            self.hashes.setdefault(value, []).append(offset + shift)
@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from .profiler import DISABLED_PROFILER
+
+DEBUG_MODES = ("off", "every_n", "kept")
+
+
+def draw_debug_frame(frame, status, fixed_top_height, fixed_bottom_height, content_end, overlap_region=None, new_content_start=None):
+    debug_frame = frame.copy()
+
+    # 使用虚线标记固定区域
+    cv2.line(debug_frame, (0, fixed_top_height), (debug_frame.shape[1], fixed_top_height), (0, 255, 0), 2, lineType=cv2.LINE_AA, shift=0)
+    cv2.line(debug_frame, (0, debug_frame.shape[0] - fixed_bottom_height), (debug_frame.shape[1], debug_frame.shape[0] - fixed_bottom_height), (0, 255, 0), 2, lineType=cv2.LINE_AA, shift=0)
+
+    # 标记可变动区域
+    cv2.rectangle(debug_frame, (0, fixed_top_height), (debug_frame.shape[1], debug_frame.shape[0] - fixed_bottom_height), (255, 255, 0), 2, lineType=cv2.LINE_AA)
+
+    # 标记内容结束位置
+    cv2.line(debug_frame, (0, content_end), (debug_frame.shape[1], content_end), (0, 0, 255), 2, lineType=cv2.LINE_AA, shift=0)
+
+    # 标记重复区域
+    if overlap_region:
+        cv2.rectangle(debug_frame, (0, overlap_region[0]), (debug_frame.shape[1], overlap_region[1]), (255, 0, 255), 2, lineType=cv2.LINE_AA)
+
+    # 标记新内容开始位置
+    if new_content_start:
+        cv2.line(debug_frame, (0, new_content_start), (debug_frame.shape[1], new_content_start), (0, 255, 255), 2, lineType=cv2.LINE_AA, shift=0)
+
+    # 添加文字说明
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 1.0
+    font_thickness = 2
+
+    def put_centered_text(img, text, y):
+        text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
+        text_x = (img.shape[1] - text_size[0]) // 2
+        text_color = (0, 0, 255)  # 红色，BGR 格式
+        cv2.putText(img, text, (text_x, y), font, font_scale, text_color, font_thickness, cv2.LINE_AA)
+
+    put_centered_text(debug_frame, "Fixed Top Area", fixed_top_height - 30)
+    put_centered_text(debug_frame, "Fixed Bottom Area", debug_frame.shape[0] - fixed_bottom_height + 30)
+    put_centered_text(debug_frame, "Variable Area", (fixed_top_height + debug_frame.shape[0] - fixed_bottom_height) // 2)
+    put_centered_text(debug_frame, "Content End", content_end + 30)
+    if overlap_region:
+        put_centered_text(debug_frame, "Overlap Area", overlap_region[0] + 30)
+    if new_content_start:
+        put_centered_text(debug_frame, "New Content Start", new_content_start - 30)
+
+    # 在图片中央添加状态文字
+    put_centered_text(debug_frame, status, debug_frame.shape[0] // 2)
+    return debug_frame
+
+
+# 调试帧在后台线程池中绘制并编码，分析循环只负责提交，队列满时直接丢弃
+class DebugFrameWriter:
+    def __init__(self, output_dir, mode="kept", every_n=10, max_workers=2, max_pending=8,
+                 max_bytes=256 * 1024 * 1024, jpeg_quality=80, profiler=None):
+        if mode not in DEBUG_MODES:
+            raise ValueError(f"Unknown debug mode: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode  # off：不输出；every_n：每 N 帧一张；kept：只输出保留的帧
+        self.every_n = max(1, every_n)
+        self.max_bytes = max_bytes  # 单次运行写入的字节上限
+        self.jpeg_quality = jpeg_quality
+        self.profiler = profiler or DISABLED_PROFILER
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.limit_reached = False
+        self.lock = threading.Lock()
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        if self.mode != "off":
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="debug-writer")
+
+    def wants(self, frame_number, kept):
+        if self.executor is None or self.limit_reached:
+            return False
+        if self.mode == "kept":
+            return kept
+        return frame_number % self.every_n == 0
+
+    def submit(self, frame, frame_number, status, kept, *overlay_args):
+        if not self.wants(frame_number, kept):
+            return False
+        if not self.pending.acquire(blocking=False):
+            with self.lock:
+                self.frames_dropped += 1
+            self.profiler.count("debug_frames_dropped")
+            return False
+        # frame 之后不会被修改，绘制时会先复制一份，这里不需要拷贝
+        future = self.executor.submit(self.write, frame, frame_number, status, overlay_args)
+        future.add_done_callback(lambda _: self.pending.release())
+        return True
+
+    def write(self, frame, frame_number, status, overlay_args):
+        with self.profiler.stage("debug_draw", frame.nbytes):
+            debug_frame = draw_debug_frame(frame, status, *overlay_args)
+        with self.profiler.stage("debug_encode"):
+            ok, buffer = cv2.imencode(".jpg", debug_frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        with self.lock:
+            if self.bytes_written + buffer.nbytes > self.max_bytes:
+                self.limit_reached = True
+                return
+            self.bytes_written += buffer.nbytes
+            self.frames_written += 1
+        filename = os.path.join(self.output_dir, f"frame_{frame_number:04d}_{status}.jpg")
+        with self.profiler.stage("debug_write", buffer.nbytes):
+            with open(filename, "wb") as f:
+                f.write(buffer.tobytes())
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,77 @@
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from .scroll_estimator import row_signature
+from .video_engine import VideoEngine
+
+
+def compare_estimators(video_path, fixed_top_height=120, fixed_bottom_height=70, tolerance=100, max_frames=None, bands=4):
+    # 对相邻帧分别运行差分估计与行签名估计，统计耗时与结果差异
+    engine = VideoEngine(video_path, fixed_top_height=fixed_top_height, fixed_bottom_height=fixed_bottom_height)
+    cap = cv2.VideoCapture(video_path)
+    diff_time = 0.0
+    signature_time = 0.0
+    diff_results = []
+    signature_results = []
+    last_content = None
+    last_signature = None
+    index = 0
+    while max_frames is None or index < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        content_frame = frame[fixed_top_height:frame.shape[0] - fixed_bottom_height]
+
+        start = time.perf_counter()
+        signature = row_signature(content_frame, bands)
+        if last_signature is not None:
+            signature_results.append(engine.find_new_content_start_by_signature(signature, last_signature))
+        signature_time += time.perf_counter() - start
+
+        if last_content is not None:
+            start = time.perf_counter()
+            diff_results.append(engine.find_new_content_start(content_frame, last_content, tolerance))
+            diff_time += time.perf_counter() - start
+
+        last_content = content_frame
+        last_signature = signature
+        index += 1
+    cap.release()
+
+    pairs = len(diff_results)
+    both = [(d, s) for d, s in zip(diff_results, signature_results) if d is not None and s is not None]
+    return {
+        "pairs": pairs,
+        "diff_ms": diff_time / pairs * 1000 if pairs else 0.0,
+        "signature_ms": signature_time / pairs * 1000 if pairs else 0.0,
+        "diff_new_content": sum(r is not None for r in diff_results),
+        "signature_new_content": sum(r is not None for r in signature_results),
+        "agree_no_new_content": sum(d is None and s is None for d, s in zip(diff_results, signature_results)),
+        "mean_start_delta": float(np.mean([abs(int(d) - int(s)) for d, s in both])) if both else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m components.estimator_compare",
+                                     description="Compare the diff and row-signature new-content estimators.")
+    parser.add_argument("video")
+    parser.add_argument("--top", type=int, default=120)
+    parser.add_argument("--bottom", type=int, default=70)
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    report = compare_estimators(args.video, args.top, args.bottom, max_frames=args.max_frames)
+    print(f"Frame pairs:            {report['pairs']}")
+    print(f"diff estimator:         {report['diff_ms']:.3f} ms/pair, new content in {report['diff_new_content']} pairs")
+    print(f"signature estimator:    {report['signature_ms']:.3f} ms/pair, new content in {report['signature_new_content']} pairs")
+    print(f"Both report no change:  {report['agree_no_new_content']} pairs")
+    print(f"Mean start row delta:   {report['mean_start_delta']:.1f} px")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
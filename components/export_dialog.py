@@ -0,0 +1,78 @@
+from PyQt5.QtWidgets import (QDialog, QFormLayout, QComboBox, QCheckBox, QDialogButtonBox,
+                             QFileDialog, QProgressDialog, QMessageBox)
+from PyQt5.QtCore import Qt
+
+from .export_thread import ExportThread
+
+FORMAT_CHOICES = [("PNG（无损）", "png"), ("JPEG", "jpeg"), ("WebP", "webp"), ("PDF（多页）", "pdf")]
+PRESET_CHOICES = [("原图", "original"), ("高质量", "high"), ("均衡", "balanced"), ("小文件", "small")]
+
+
+class ExportDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("导出")
+        layout = QFormLayout(self)
+        self.format_box = QComboBox()
+        for text, fmt in FORMAT_CHOICES:
+            self.format_box.addItem(text, fmt)
+        layout.addRow("格式", self.format_box)
+        self.preset_box = QComboBox()
+        for text, preset in PRESET_CHOICES:
+            self.preset_box.addItem(text, preset)
+        self.preset_box.setCurrentIndex(2)
+        layout.addRow("质量", self.preset_box)
+        self.downscale_box = QCheckBox("按预设缩小宽度")
+        self.downscale_box.setChecked(True)
+        layout.addRow("", self.downscale_box)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def options(self):
+        return {
+            "fmt": self.format_box.currentData(),
+            "preset": self.preset_box.currentData(),
+            "max_width": None if self.downscale_box.isChecked() else 0,
+        }
+
+
+def start_export(parent, segments):
+    # 选择格式和保存位置，然后在后台导出并显示进度；返回导出线程，取消选择时返回 None
+    dialog = ExportDialog(parent)
+    if dialog.exec_() != QDialog.Accepted:
+        return None
+    options = dialog.options()
+    if options["fmt"] == "pdf":
+        output_path, _ = QFileDialog.getSaveFileName(parent, "保存 PDF", "chat.pdf", "PDF (*.pdf)")
+    else:
+        output_path = QFileDialog.getExistingDirectory(parent, "选择导出目录")
+    if not output_path:
+        return None
+
+    thread = ExportThread(segments, output_path, **options)
+    progress = QProgressDialog("正在导出…", "取消", 0, len(thread.segments), parent)
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setMinimumDuration(0)
+    progress.canceled.connect(thread.cancel)
+
+    def on_progress(done, total):
+        progress.setValue(done)
+
+    def on_finished(paths):
+        progress.reset()
+        if thread.exporter.cancelled:
+            QMessageBox.information(parent, "导出", f"已取消，写出 {len(paths)} 个文件")
+        else:
+            QMessageBox.information(parent, "导出", f"已导出到 {output_path}")
+
+    def on_failed(message):
+        progress.reset()
+        QMessageBox.warning(parent, "导出失败", message)
+
+    thread.progress.connect(on_progress)
+    thread.finished.connect(on_finished)
+    thread.failed.connect(on_failed)
+    thread.start()
+    return thread
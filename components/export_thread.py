@@ -0,0 +1,28 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from .exporter import SegmentExporter
+
+
+# 在后台线程中导出，编码本身由 SegmentExporter 的线程池并行完成
+class ExportThread(QThread):
+    progress = pyqtSignal(int, int)  # (已完成数, 总数)
+    finished = pyqtSignal(list)  # 写出的文件列表
+    failed = pyqtSignal(str)
+
+    def __init__(self, segments, output_path, fmt="png", preset="balanced", max_width=None):
+        super().__init__()
+        self.segments = segments  # 传入 SegmentStore.snapshot() 或列表，导出过程中用户继续删除段也不受影响
+        self.exporter = SegmentExporter(output_path, fmt, preset, max_width=max_width,
+                                        progress_callback=self.progress.emit)
+
+    def cancel(self):
+        self.exporter.cancel()
+
+    def run(self):
+        try:
+            paths = self.exporter.export(self.segments)
+        except Exception as e:
+            # 任何异常都要发送 failed（cv2.error、zlib.error、MemoryError 等），否则导出进度对话框不会关闭
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        self.finished.emit(paths)
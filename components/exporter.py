@@ -0,0 +1,191 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from .segment_store import SegmentStore
+
+FORMAT_EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp", "pdf": ".pdf"}
+
+# quality 对 JPEG/WebP（以及 PDF 中的 JPEG 页面）有效，PNG 总是无损；max_width 为 None 时不缩小
+PRESETS = {
+    "original": {"quality": 95, "max_width": None},
+    "high": {"quality": 90, "max_width": 1080},
+    "balanced": {"quality": 80, "max_width": 828},
+    "small": {"quality": 60, "max_width": 640},
+}
+
+
+def scale_segment(segment, max_width):
+    # 只缩小不放大，INTER_AREA 缩小文字时最清晰
+    height, width = segment.shape[:2]
+    if not max_width or width <= max_width:
+        return segment
+    size = (max_width, max(1, round(height * max_width / width)))
+    return cv2.resize(segment, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_segment(segment, fmt, quality=90, max_width=None, png_compression=3):
+    # 返回编码后的字节（numpy 缓冲区）和缩放后的尺寸；PDF 页面以 JPEG 编码
+    segment = scale_segment(segment, max_width)
+    if fmt == "png":
+        ext, params = ".png", [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    elif fmt == "webp":
+        ext, params = ".webp", [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif fmt in ("jpeg", "pdf"):
+        ext, params = ".jpg", [cv2.IMWRITE_JPEG_QUALITY, quality]
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    ok, buffer = cv2.imencode(ext, segment, params)
+    if not ok:
+        raise ValueError(f"Failed to encode segment as {fmt}")
+    height, width = segment.shape[:2]
+    return buffer, width, height
+
+
+# 流式写多页 PDF：每页一张 JPEG（DCTDecode，不需要重新压缩），写完一页就不再保留在内存中；
+# 页面树和交叉引用表在 close() 时写出
+class PdfWriter:
+    def __init__(self, path, dpi=96):
+        self.path = path
+        self.scale = 72 / dpi  # 像素换算成 PDF 的点
+        self.file = open(path, "wb")
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 3  # 1 为 Catalog，2 为 Pages
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def write_object(self, object_id, body, stream=None):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode())
+        self.file.write(body)
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            self.file.write(stream)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def add_jpeg_page(self, data, width, height):
+        image_id, content_id, page_id = self.next_id, self.next_id + 1, self.next_id + 2
+        self.next_id += 3
+        page_width, page_height = width * self.scale, height * self.scale
+        self.write_object(image_id, (f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                                     f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode "
+                                     f"/Length {len(data)} >>").encode(), data)
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode()
+        self.write_object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+        self.write_object(page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.2f} {page_height:.2f}] "
+                                    f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+                                    f"/Contents {content_id} 0 R >>").encode())
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self.write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        self.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self.file.tell()
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        # 对象号连续分配，全部写出过
+        lines.extend(f"{self.offsets[object_id]:010d} 00000 n \n" for object_id in range(1, self.next_id))
+        lines.append(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self.file.write("".join(lines).encode())
+        self.file.close()
+
+
+# 在线程池中并行编码（cv2.imencode 执行时释放 GIL，可以用满所有核心）。
+# 同时在途的段不超过 workers * 2 个：图片格式由工作线程直接写文件，PDF 由当前线程按顺序写入页面，
+# 任何时候内存中只有少量编码结果
+class SegmentExporter:
+    def __init__(self, output_path, fmt="png", preset="balanced", quality=None, max_width=None, workers=None,
+                 prefix="segment", progress_callback=None):
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        settings = PRESETS[preset]
+        self.output_path = output_path  # 图片格式为输出目录，PDF 为输出文件
+        self.fmt = fmt
+        self.quality = quality if quality is not None else settings["quality"]
+        self.max_width = max_width if max_width is not None else settings["max_width"]  # 传 0 表示不缩小
+        self.workers = workers or os.cpu_count() or 1
+        self.prefix = prefix
+        self.progress_callback = progress_callback  # progress_callback(已完成数, 总数)
+        self.cancel_event = threading.Event()
+        self.bytes_written = 0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def segment_path(self, number):
+        return os.path.join(self.output_path, f"{self.prefix}_{number + 1:04d}{FORMAT_EXTENSIONS[self.fmt]}")
+
+    def encode(self, segment):
+        if callable(segment):
+            segment = segment()  # SegmentStore 中压缩保存的段在工作线程中解压
+        return encode_segment(segment, self.fmt, self.quality, self.max_width)
+
+    def write_file(self, number, segment):
+        buffer, _, _ = self.encode(segment)
+        path = self.segment_path(number)
+        with open(path, "wb") as f:
+            f.write(buffer.tobytes())
+        return path, buffer.nbytes
+
+    def export(self, segments):
+        # 返回写出的文件列表（PDF 为只含一个文件的列表）；取消时返回已经写出的部分
+        total = len(segments)
+        if isinstance(segments, SegmentStore):
+            segments = [segments.loader(index) for index in range(total)]
+        if self.fmt == "pdf":
+            directory = os.path.dirname(self.output_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            writer = PdfWriter(self.output_path)
+            handle = writer.add_jpeg_page
+        else:
+            os.makedirs(self.output_path, exist_ok=True)
+            writer = handle = None
+        paths = []
+        done = 0
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                try:
+                    for number, segment in enumerate(segments):
+                        if self.cancel_event.is_set():
+                            break
+                        if writer is not None:
+                            pending.append(executor.submit(self.encode, segment))
+                        else:
+                            pending.append(executor.submit(self.write_file, number, segment))
+                        if len(pending) >= self.workers * 2:
+                            done = self.collect(pending.popleft(), handle, paths, done, total)
+                    while pending and not self.cancel_event.is_set():
+                        done = self.collect(pending.popleft(), handle, paths, done, total)
+                finally:
+                    for future in pending:
+                        future.cancel()
+        finally:
+            if writer is not None:
+                writer.close()  # 取消时已写入的页面仍组成完整的 PDF
+        if writer is not None:
+            self.bytes_written = os.path.getsize(self.output_path)
+            paths = [self.output_path]
+        return paths
+
+    def collect(self, future, handle, paths, done, total):
+        if handle is not None:
+            buffer, width, height = future.result()
+            handle(buffer.tobytes(), width, height)
+        else:
+            path, nbytes = future.result()
+            paths.append(path)
+            self.bytes_written += nbytes
+        done += 1
+        if self.progress_callback is not None:
+            self.progress_callback(done, total)
+        return done
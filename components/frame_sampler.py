@@ -0,0 +1,116 @@
+import cv2
+
+from .scroll_estimator import row_signature, estimate_row_shift
+
+
+# 自适应抽帧：用 grab() 廉价跳过帧，只对采样帧 retrieve() 解码并分析
+class AdaptiveFrameSampler:
+    def __init__(self, cap, total_frames, fixed_top_height, fixed_bottom_height,
+                 min_stride=1, max_stride=8, target_shift_ratio=0.35, min_overlap=60):
+        self.cap = cap
+        self.total_frames = total_frames
+        self.fixed_top_height = fixed_top_height
+        self.fixed_bottom_height = fixed_bottom_height
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.target_shift_ratio = target_shift_ratio  # 相邻采样帧之间期望的滚动量占内容区高度的比例
+        self.min_overlap = min_overlap
+        self.frames_grabbed = 0  # 覆盖到的不同帧数（到达过的最大帧号 + 1），回退后重复 grab 的帧不计入
+        self.frames_decoded = 0
+        self.backtracks = 0
+        self.regrabs = 0  # 回退或重新定位后再次 grab 已经走过的帧的次数
+
+    def next_stride(self, shift, stride, content_height):
+        velocity = abs(shift) / stride  # 每帧滚动的像素数
+        if velocity < 0.5:
+            # 画面静止，逐步放大步长
+            return min(stride * 2, self.max_stride)
+        target_shift = content_height * self.target_shift_ratio
+        return max(self.min_stride, min(self.max_stride, int(target_shift / velocity)))
+
+    def count_grab(self, index):
+        if index < self.frames_grabbed:
+            self.regrabs += 1
+        else:
+            self.frames_grabbed = index + 1
+
+    def advance(self, index, stride):
+        # 从 index 向后走 stride 帧，用 grab() 跳过中间的帧，只解码停下的那一帧；返回 (帧号, 帧)，没有新帧时返回 None
+        start = index
+        grabbed = True
+        for _ in range(stride):
+            if index + 1 >= self.total_frames:
+                break  # 步长越过末尾时停在最后一帧，最后一帧总会被分析，滚动到底的内容不会丢失
+            if not self.cap.grab():
+                grabbed = False
+                break
+            index += 1
+            self.count_grab(index)
+        if index == start:
+            return None
+        if not grabbed:
+            # 帧数统计偏大时 grab 会提前失败，重新定位到最后一个成功 grab 的帧
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            if not self.cap.grab():
+                return None
+            self.count_grab(index)
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            return None
+        self.frames_decoded += 1
+        return index, frame
+
+    def content_signature(self, frame):
+        return row_signature(frame[self.fixed_top_height:frame.shape[0] - self.fixed_bottom_height])
+
+    def __iter__(self):
+        index = -1
+        stride = self.min_stride
+        last_index = None
+        last_signature = None
+        last_velocity = 0.0
+        fine_until = -1  # 到这一帧之前逐帧读取
+        peeked = None  # 判断是否转为向回滚动时多读的下一帧，作为下一个采样帧
+        while index + 1 < self.total_frames:
+            sample = peeked or self.advance(index, stride if last_index is not None else 1)
+            peeked = None
+            if sample is None:
+                return
+            index, frame = sample
+            signature = self.content_signature(frame)
+            if last_signature is not None:
+                shift = estimate_row_shift(last_signature, signature, self.min_overlap)
+                step = index - last_index
+                if shift is None:
+                    if stride > self.min_stride:
+                        # 跳得太远，两帧之间已没有重叠，回退到上一采样帧之后逐帧读取
+                        self.backtracks += 1
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, last_index + 1)
+                        index = last_index
+                        stride = self.min_stride
+                        continue
+                    stride = self.min_stride
+                elif step > self.min_stride and 0 < last_velocity * step / 2 > shift:
+                    # 滚动量远小于按之前速度预期的值：减速停顿，或在两个采样帧之间转为向回滚动。
+                    # 后者滚动最远的帧被跳过，它底部的内容之后不会再出现；多读一帧，已经在向回滚动时
+                    # 回退到上一采样帧之后逐帧读取到这一帧，保证分析到转折处
+                    peeked = self.advance(index, 1)
+                    if peeked is not None:
+                        next_shift = estimate_row_shift(signature, self.content_signature(peeked[1]), self.min_overlap)
+                        if next_shift is not None and next_shift < 0:
+                            self.backtracks += 1
+                            self.cap.set(cv2.CAP_PROP_POS_FRAMES, last_index + 1)
+                            peeked = None
+                            fine_until = index
+                            index = last_index
+                            stride = self.min_stride
+                            continue
+                    stride = self.min_stride
+                elif index < fine_until:
+                    stride = self.min_stride
+                else:
+                    stride = self.next_stride(shift, stride, len(signature))
+                last_velocity = shift / step
+            last_index = index
+            last_signature = signature
+            yield index, frame
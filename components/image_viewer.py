@@ -1,12 +1,30 @@
 from PyQt5.QtWidgets import (QWidget, QLabel, QVBoxLayout, QPushButton, 
-                             QHBoxLayout, QFrame)
-from PyQt5.QtCore import Qt, QSize, QTimer
-from PyQt5.QtGui import QPixmap, QImage, QIcon,QColor 
+                             QHBoxLayout, QFrame, QMessageBox)
+from PyQt5.QtCore import Qt, QSize, QTimer, QThreadPool
+from PyQt5.QtGui import QPixmap, QIcon,QColor 
+
+from .export_dialog import start_export
+from .segment_store import SegmentStore
+from .thumbnail_cache import ThumbnailCache, ThumbnailSignals, ThumbnailTask, render_thumbnail
 
 class ImageViewer(QWidget):
+    image_width = 552
+    image_height = 1280
+    prefetch_radius = 3  # 预取当前位置前后各几张
+
     def __init__(self, frames):
         super().__init__()
-        self.images = [QImage(frame.data, frame.shape[1], frame.shape[0], QImage.Format_RGB888).rgbSwapped() for frame in frames]
+        # 段由 SegmentStore 保存（只含裁剪后的行，可压缩），按位置取出；
+        # 缩略图按需生成并以存储中的 key 缓存，key 在删除帧后保持不变
+        self.images = frames if isinstance(frames, SegmentStore) else SegmentStore.from_frames(frames)
+        self.shown_count = len(self.images)
+        self.processing = False  # 处理仍在进行时存储中陆续加入新的段，segments_added() 刷新显示
+        self.export_thread = None
+        self.thumbnail_cache = ThumbnailCache()
+        self.pending_keys = set()
+        self.thread_pool = QThreadPool.globalInstance()
+        self.thumbnail_signals = ThumbnailSignals()
+        self.thumbnail_signals.rendered.connect(self.on_thumbnail_rendered)
         self.current_index = 0
         self.selected_image = 0  # 0 表示左侧图片被选中，1 表示右侧图片被选中
         self.initUI()
@@ -89,7 +107,25 @@ class ImageViewer(QWidget):
     def update_image_count_label(self):
             current_image = self.current_index + self.selected_image + 1
             total_images = len(self.images)
-            self.image_count_label.setText(f"第 {current_image} 张 / 共计 {total_images} 张")
+            text = f"第 {current_image} 张 / 共计 {total_images} 张"
+            if self.processing:
+                text += "（处理中…）"
+            self.image_count_label.setText(text)
+
+    def segments_added(self):
+        previous_count, self.shown_count = self.shown_count, len(self.images)
+        if previous_count < self.current_index + 2:
+            # 新的段落在当前显示的位置上，立即显示
+            self.show_images()
+            self.update_selection_frame()
+        else:
+            self.update_image_count_label()
+            if previous_count < self.current_index + 2 + self.prefetch_radius:
+                self.prefetch_thumbnails()
+
+    def set_processing(self, processing):
+        self.processing = processing
+        self.update_image_count_label()
 
     def create_vertical_button(self, text, color):
         button = QPushButton("\n".join(text))
@@ -115,18 +151,40 @@ class ImageViewer(QWidget):
         h, s, v, _ = c.getHsv()
         return QColor.fromHsv(h, s, max(0, v - 20)).name()
 
+    def get_thumbnail(self, index):
+        key = self.images.key(index)
+        image = self.thumbnail_cache.get(key)
+        if image is None:
+            # 当前要显示的图没有缓存时直接在 GUI 线程生成
+            image = render_thumbnail(self.images[index], self.image_width, self.image_height)
+            self.thumbnail_cache.put(key, image)
+        return image
+
+    def prefetch_thumbnails(self):
+        start = max(0, self.current_index - self.prefetch_radius)
+        end = min(len(self.images), self.current_index + 2 + self.prefetch_radius)
+        for index in range(start, end):
+            key = self.images.key(index)
+            if key in self.thumbnail_cache or key in self.pending_keys:
+                continue
+            self.pending_keys.add(key)
+            self.thread_pool.start(ThumbnailTask(key, self.images.loader(index), self.image_width, self.image_height,
+                                                 self.thumbnail_signals))
+
+    def on_thumbnail_rendered(self, key, image):
+        self.pending_keys.discard(key)
+        if self.images.has_key(key) and key not in self.thumbnail_cache:
+            self.thumbnail_cache.put(key, image)
+
     def show_images(self):
-        image_width = 552
-        image_height = 1280
         for i, label in enumerate(self.image_labels):
             index = self.current_index + i
             if index < len(self.images):
-                pixmap = QPixmap.fromImage(self.images[index])
-                scaled_pixmap = pixmap.scaled(image_width, image_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                label.setPixmap(scaled_pixmap)
+                label.setPixmap(QPixmap.fromImage(self.get_thumbnail(index)))
             else:
                 label.clear()
-            self.update_image_count_label()
+        self.update_image_count_label()
+        self.prefetch_thumbnails()
 
     def update_selection_frame(self):
         if self.images:
@@ -157,7 +215,11 @@ class ImageViewer(QWidget):
 
     def delete_current(self):
         if self.images:
-            del self.images[self.current_index + self.selected_image]
+            index = self.current_index + self.selected_image
+            # 只移除被删除帧的缓存，其他帧的 key 和缓存保持不变
+            self.thumbnail_cache.discard(self.images.key(index))
+            del self.images[index]
+            self.shown_count -= 1
             if self.current_index + self.selected_image >= len(self.images):
                 self.current_index = max(0, len(self.images) - 2)
                 self.selected_image = 0
@@ -166,7 +228,16 @@ class ImageViewer(QWidget):
             self.update_image_count_label()
             
     def go_to_next_step(self):
-        print("进入下一步")
+        # 把剩下的段导出为图片或 PDF
+        if self.processing:
+            QMessageBox.information(self, "导出", "视频仍在处理中，请稍候")
+            return
+        if not self.images:
+            QMessageBox.information(self, "导出", "没有可以导出的图片")
+            return
+        if self.export_thread is not None and self.export_thread.isRunning():
+            return
+        self.export_thread = start_export(self, self.images.snapshot())
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Space or event.key() == Qt.Key_Delete:
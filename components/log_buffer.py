@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+# 把日志记录暂存在环形缓冲区里，按时间间隔批量交给回调（例如 Qt 信号），
+# 避免每条日志都触发一次界面刷新。后台定时线程保证长时间没有新日志时，已缓冲的行也在一个间隔内送出
+class RingBufferHandler(logging.Handler):
+    def __init__(self, flush_callback, capacity=500, flush_interval=0.25, level=logging.NOTSET):
+        super().__init__(level)
+        self.flush_callback = flush_callback
+        self.flush_interval = flush_interval
+        self.records = deque(maxlen=capacity)
+        self.dropped = 0
+        self.last_flush = time.monotonic()
+        self.buffer_lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # 定时线程与 emit() 同时刷新时保持批次顺序
+        self.stop_event = threading.Event()
+        self.timer = threading.Thread(target=self.flush_periodically, name="RingBufferFlush", daemon=True)
+        self.timer.start()
+
+    def emit(self, record):
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.buffer_lock:
+            if len(self.records) == self.records.maxlen:
+                self.dropped += 1
+            self.records.append(message)
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush_periodically(self):
+        while not self.stop_event.wait(self.flush_interval):
+            with self.buffer_lock:
+                due = self.records and time.monotonic() - self.last_flush >= self.flush_interval
+            if due:
+                self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.buffer_lock:
+                self.last_flush = time.monotonic()
+                if not self.records:
+                    return
+                lines = list(self.records)
+                self.records.clear()
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.insert(0, f"... {dropped} log lines dropped ...")
+            self.flush_callback("\n".join(lines))
+
+    def close(self):
+        self.stop_event.set()
+        self.timer.join()
+        self.flush()
+        super().close()
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+
+from .segment_sinks import SegmentSink
+
+_END = object()
+
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+# 单个阶段的统计：处理数量、忙碌时间、因背压阻塞/等待输入的时间以及队列深度
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0  # 输出队列已满、等待下游的时间
+        self.starved_time = 0.0  # 输入队列为空、等待上游的时间
+        self.max_queue_depth = 0
+        self.queue_depth_total = 0
+
+    def sample_depth(self, depth):
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.queue_depth_total += depth
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "busy_time": self.busy_time,
+            "blocked_time": self.blocked_time,
+            "starved_time": self.starved_time,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_depth": self.queue_depth_total / self.items if self.items else 0.0,
+        }
+
+
+def _put(q, item, stop_event, stats):
+    # 队列满时阻塞（背压），但要能响应停止请求
+    start = time.perf_counter()
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    stats.blocked_time += time.perf_counter() - start
+
+
+# 解码阶段：在独立线程中迭代帧来源，通过有界队列交给分析阶段
+class ThreadedFrameSource:
+    def __init__(self, frames, maxsize=8):
+        self.frames = frames
+        self.queue = queue.Queue(maxsize)
+        self.stop_event = threading.Event()
+        self.decode_stats = StageStats("decode")
+        self.analyze_stats = StageStats("analyze")
+        self.thread = threading.Thread(target=self.decode_loop, name="frame-decoder", daemon=True)
+
+    def decode_loop(self):
+        try:
+            iterator = iter(self.frames)
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                self.decode_stats.busy_time += time.perf_counter() - start
+                if item is _END:
+                    break
+                self.decode_stats.items += 1
+                self.decode_stats.sample_depth(self.queue.qsize())  # 放入前队列中积压的帧数
+                _put(self.queue, item, self.stop_event, self.decode_stats)
+        except Exception as exc:
+            _put(self.queue, _Failure(exc), self.stop_event, self.decode_stats)
+            return
+        _put(self.queue, _END, self.stop_event, self.decode_stats)
+
+    def __iter__(self):
+        self.thread.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                self.analyze_stats.sample_depth(self.queue.qsize())
+                item = self.queue.get()
+                self.analyze_stats.starved_time += time.perf_counter() - start
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                self.analyze_stats.items += 1
+                start = time.perf_counter()
+                yield item
+                self.analyze_stats.busy_time += time.perf_counter() - start
+        finally:
+            self.close()
+
+    def close(self):
+        self.stop_event.set()
+        # 清空队列，让阻塞在 put 上的解码线程尽快退出
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+# 输出阶段：segment 先进入有界队列，由独立线程交给真正的 sink（编码、写盘等）
+class ThreadedSink(SegmentSink):
+    def __init__(self, sink, maxsize=8, producer_stats=None):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize)
+        self.stop_event = threading.Event()
+        self.stats = StageStats("sink")
+        # 上游（分析阶段）因队列满而阻塞的时间记在上游的统计里
+        self.producer_stats = producer_stats if producer_stats is not None else StageStats("analyze")
+        self.error = None
+        self.thread = threading.Thread(target=self.sink_loop, name="segment-sink", daemon=True)
+        self.thread.start()
+
+    def sink_loop(self):
+        while True:
+            start = time.perf_counter()
+            self.stats.sample_depth(self.queue.qsize())
+            item = self.queue.get()
+            self.stats.starved_time += time.perf_counter() - start
+            if item is _END:
+                return
+            if self.error is not None or self.stop_event.is_set():
+                continue
+            start = time.perf_counter()
+            try:
+                self.sink.add_segment(*item)
+            except Exception as exc:
+                self.error = exc
+            self.stats.busy_time += time.perf_counter() - start
+            self.stats.items += 1
+
+    def add_segment(self, segment, frame_index, meta=None):
+        if self.error is not None:
+            raise self.error
+        _put(self.queue, (segment, frame_index, meta), self.stop_event, self.producer_stats)
+
+    def close(self):
+        self.queue.put(_END)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.sink.close()
+
+    def shutdown(self):
+        # 出错或取消时停止输出线程，丢弃还在排队的段，不关闭下游 sink；close() 之后调用没有作用
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.queue.put(_END)
+            self.thread.join()
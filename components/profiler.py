@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+
+
+# 关闭时 stage() 返回这个共享对象，with 语句几乎没有额外开销
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "nbytes", "start")
+
+    def __init__(self, profiler, name, nbytes):
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+
+# 各阶段的耗时统计：单调计时、调用次数、分配字节数以及帧计数器，
+# 可选记录 Chrome trace 事件（chrome://tracing 或 Perfetto 打开）
+class StageProfiler:
+    def __init__(self, enabled=True, trace=False):
+        self.enabled = enabled
+        self.trace = enabled and trace
+        self.origin = time.perf_counter()
+        self.stages = {}  # name -> [调用次数, 总耗时, 最长耗时, 字节数]
+        self.counters = {}
+        self.events = []
+        self.thread_names = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name, nbytes=0):
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name, nbytes)
+
+    def record(self, name, start, elapsed, nbytes=0):
+        with self.lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            entry[3] += nbytes
+            if self.trace:
+                thread = threading.current_thread()
+                self.thread_names.setdefault(thread.ident, thread.name)
+                self.events.append((name, start, elapsed, thread.ident))
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def wrap(self, name, callback):
+        # 给回调（例如 Qt 信号的 emit）计时
+        if not self.enabled:
+            return callback
+
+        def timed(*args):
+            with self.stage(name):
+                return callback(*args)
+        return timed
+
+    def iterate(self, name, iterable):
+        # 给迭代器每次取下一项计时，用于解码等以生成器形式提供的阶段
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iter(iterable))
+
+    def _timed_iter(self, name, iterator):
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def summary(self):
+        with self.lock:
+            stages = {
+                name: {
+                    "calls": calls,
+                    "total_time": total,
+                    "mean_time": total / calls if calls else 0.0,
+                    "max_time": longest,
+                    "bytes": nbytes,
+                }
+                for name, (calls, total, longest, nbytes) in sorted(self.stages.items(), key=lambda item: -item[1][1])
+            }
+            return {
+                "wall_time": time.perf_counter() - self.origin,
+                "stages": stages,
+                "counters": dict(self.counters),
+            }
+
+    def write_chrome_trace(self, path):
+        # Trace Event Format：ts/dur 以微秒为单位
+        pid = os.getpid()
+        with self.lock:
+            events = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for tid, name in self.thread_names.items()
+            ]
+            events.extend(
+                {"name": name, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": (start - self.origin) * 1e6, "dur": elapsed * 1e6}
+                for name, start, elapsed, tid in self.events
+            )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+DISABLED_PROFILER = StageProfiler(enabled=False)
+
+
+def format_summary(summary):
+    # 把 summary() 的结果整理成适合日志或终端输出的文本
+    lines = [f"Run profile ({summary['wall_time']:.2f}s wall):"]
+    for name, stage in summary["stages"].items():
+        line = (f"  {name:<16} {stage['total_time'] * 1000:9.1f} ms  {stage['calls']:7d} calls  "
+                f"{stage['mean_time'] * 1e6:8.1f} us/call")
+        if stage["bytes"]:
+            line += f"  {stage['bytes'] / (1024 * 1024):8.1f} MB"
+        lines.append(line)
+    if summary["counters"]:
+        lines.append("  " + ", ".join(f"{name}: {value}" for name, value in sorted(summary["counters"].items())))
+    return "\n".join(lines)
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from .segment_sinks import SegmentSink, ListSink
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".wxv2p", "cache")
+
+
+def video_fingerprint(path, samples=8, sample_size=64 * 1024):
+    # 文件大小 + 均匀分布的若干块字节的哈希，不需要读完整个文件
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        for k in range(samples):
+            f.seek(max(0, (size - sample_size) * k // max(1, samples - 1)))
+            digest.update(f.read(sample_size))
+    return f"{size}-{digest.hexdigest()}"
+
+
+def engine_params(engine):
+    # 影响保留哪些段的全部参数；调试输出、线程方式等不影响结果的参数不计入
+    return {
+        "version": CACHE_VERSION,
+        "fixed_top_height": engine.fixed_top_height,
+        "fixed_bottom_height": engine.fixed_bottom_height,
+        "overlap": engine.overlap,
+        "tolerance": engine.tolerance,
+        "estimator": engine.estimator,
+        "signature_bands": engine.signature_bands,
+        "adaptive_sampling": engine.adaptive_sampling,
+        "max_stride": engine.max_stride,
+        "max_frames": engine.max_frames,
+        "gray_analysis": engine.gray_analysis,
+        "analysis_width_scale": engine.analysis_width_scale,
+        "analysis_height_scale": engine.analysis_height_scale,
+        "dedup": engine.dedup,
+        "dedup_block": engine.dedup_block,
+    }
+
+
+def cache_key(fingerprint, params):
+    payload = json.dumps({"video": fingerprint, "params": params}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+# 磁盘上的结果缓存：每个条目一个目录，index.json 记录保留段在原视频中的位置，
+# 可选保存每段的 PNG。总大小超过 max_bytes 时按最近使用时间淘汰
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        index_path = os.path.join(self.entry_dir(key), "index.json")
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(index_path)  # 记录最近使用时间
+        return index
+
+    def begin(self, key):
+        # 新条目先写入临时目录，put() 时再改名，其他进程不会读到写了一半的条目
+        temp_dir = os.path.join(self.directory, f".{key}.{os.getpid()}.tmp")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        return temp_dir
+
+    def put(self, key, index, temp_dir):
+        with self.lock:
+            with open(os.path.join(temp_dir, "index.json"), "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            try:
+                os.rename(temp_dir, self.entry_dir(key))
+            except OSError:
+                shutil.rmtree(temp_dir, ignore_errors=True)  # 已有相同条目
+            self.evict()
+
+    def remove(self, key):
+        with self.lock:
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def segment_path(self, key, number):
+        return segment_file(self.entry_dir(key), number)
+
+    def entries(self):
+        # 返回 [(最近使用时间, 字节数, key)]
+        entries = []
+        for key in os.listdir(self.directory):
+            entry_dir = self.entry_dir(key)
+            index_path = os.path.join(entry_dir, "index.json")
+            if key.startswith(".") or not os.path.isfile(index_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            entries.append((os.path.getmtime(index_path), size, key))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            total -= size
+
+
+def segment_file(entry_dir, number):
+    return os.path.join(entry_dir, f"segment_{number:04d}.png")
+
+
+# 转发给内部 sink 的同时记录每段的位置；给出 segment_dir 时把每段编码成 PNG 立即写入缓存目录
+class RecordingSink(SegmentSink):
+    def __init__(self, sink, frame_height, segment_dir=None, compression=1):
+        self.sink = sink
+        self.frame_height = frame_height
+        self.segment_dir = segment_dir
+        self.compression = compression
+        self.records = []
+
+    def add_segment(self, segment, frame_index, meta=None):
+        self.sink.add_segment(segment, frame_index, meta)
+        # 段总是原帧从 start_y 到底部的部分，记录 start_y 即可从视频中重新裁剪
+        if self.segment_dir is not None:
+            ok, buffer = cv2.imencode(".png", segment, [cv2.IMWRITE_PNG_COMPRESSION, self.compression])
+            if not ok:
+                raise ValueError(f"Failed to encode segment from frame {frame_index}")
+            with open(segment_file(self.segment_dir, len(self.records)), "wb") as f:
+                f.write(buffer.tobytes())
+        self.records.append({"frame_index": int(frame_index), "start_y": self.frame_height - segment.shape[0], "meta": meta})
+
+    def close(self):
+        return self.sink.close()
+
+
+def read_recorded_frames(video_path, records, max_gap=64):
+    # 按记录顺序产出保留帧：间隔不大时用 grab() 顺序跳过，比逐帧 seek 快得多
+    cap = cv2.VideoCapture(video_path)
+    position = 0
+    try:
+        for record in records:
+            index = record["frame_index"]
+            if index < position or index - position > max_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            else:
+                for _ in range(index - position):
+                    cap.grab()
+            ret, frame = cap.read()
+            if not ret:
+                raise IOError(f"Failed to read frame {index} from {video_path}")
+            position = index + 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def entry_usable(cache, key, index, video_path):
+    # 回放前检查条目完整：段一旦交给 sink 就无法撤回，回放到一半才发现问题会让结果重复
+    try:
+        records = index["segments"]
+        frame_indices = [record["frame_index"] for record in records]
+        if index["has_segments"]:
+            return all(os.path.getsize(cache.segment_path(key, number)) > 0 for number in range(len(records)))
+    except (KeyError, TypeError, OSError):
+        return False
+    if not frame_indices:
+        return True
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return cap.isOpened() and int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) > max(frame_indices)
+    finally:
+        cap.release()
+
+
+def replay(cache, key, index, video_path, sink, cancel_event=None):
+    # 命中缓存时不分析：保存了 PNG 时直接读取（不需要原视频），否则只解码到保留的帧并按记录的位置裁剪
+    records = index["segments"]
+    if index["has_segments"]:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            paths = [cache.segment_path(key, number) for number in range(len(records))]
+            for record, segment in zip(records, executor.map(cv2.imread, paths)):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if segment is None:
+                    raise IOError(f"Missing cached segment for frame {record['frame_index']}")
+                sink.add_segment(segment, record["frame_index"], record["meta"])
+    else:
+        frames = read_recorded_frames(video_path, records)
+        try:
+            for record, frame in zip(records, frames):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                sink.add_segment(frame[record["start_y"]:], record["frame_index"], record["meta"])
+        finally:
+            frames.close()  # 提前结束时也释放 VideoCapture
+    return sink.close()
+
+
+def cached_process(engine, cache, sink=None, store_segments=False):
+    # 与 engine.process(sink) 相同，但相同视频、相同参数的结果直接从缓存取回。
+    # 默认只保存段的位置，命中时顺序解码原视频即可（比解码 PNG 快）；
+    # store_segments 时额外保存每段的 PNG，原视频移走后仍可使用
+    if sink is None:
+        sink = ListSink()
+    start_time = time.perf_counter()
+    key = cache_key(video_fingerprint(engine.video_path), engine_params(engine))
+    index = cache.get(key)
+    if index is not None and not entry_usable(cache, key, index, engine.video_path):
+        # 删除损坏的条目，重新处理后写入新条目
+        engine.logger.warning("Cache entry %s is unusable, processing again", key)
+        cache.remove(key)
+        index = None
+    if index is not None:
+        try:
+            result = replay(cache, key, index, engine.video_path, sink, engine.cancel_event)
+        except (IOError, KeyError):
+            # 部分段已经交给 sink，不能再接着处理到同一个 sink 中
+            cache.remove(key)
+            raise
+        elapsed = time.perf_counter() - start_time
+        engine.frame_count = len(index["segments"])
+        engine.stats = {
+            "total_frames": index["total_frames"],
+            "frames_read": 0,
+            "frames_grabbed": 0,
+            "backtracks": 0,
+            "regrabs": 0,
+            "frames_kept": engine.frame_count,
+            "elapsed": elapsed,
+            "fps": 0.0,
+            "cache": "hit",
+            "cancelled": engine.cancelled,
+        }
+        engine.report_progress(100)
+        engine.logger.info("Loaded %d segments from cache in %.2fs", engine.frame_count, elapsed)
+        return result
+
+    cap = cv2.VideoCapture(engine.video_path)
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    temp_dir = cache.begin(key)
+    recorder = RecordingSink(sink, frame_height, temp_dir if store_segments else None)
+    try:
+        result = engine.process(recorder)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    engine.stats["cache"] = "miss"
+    if engine.cancelled:
+        shutil.rmtree(temp_dir, ignore_errors=True)  # 只处理了一部分，不能作为缓存结果
+        return result
+    index = {
+        "video": os.path.abspath(engine.video_path),
+        "total_frames": engine.stats["total_frames"],
+        "has_segments": store_segments,
+        "segments": recorder.records,
+    }
+    cache.put(key, index, temp_dir)
+    return result
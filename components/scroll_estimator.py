@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+
+
+def row_signature(content_frame, bands=1):
+    # 把内容区压缩成每行的灰度均值；bands > 1 时按列分成若干条带，分别取均值
+    if content_frame.ndim == 3:
+        content_frame = cv2.cvtColor(content_frame, cv2.COLOR_BGR2GRAY)
+    if bands <= 1:
+        return cv2.reduce(content_frame, 1, cv2.REDUCE_AVG, dtype=cv2.CV_32F).ravel()
+    height = content_frame.shape[0]
+    width = content_frame.shape[1] - content_frame.shape[1] % bands
+    # 每行拆成 bands 段后按行求均值，reshape 只在连续内存上才是零拷贝
+    band_rows = np.ascontiguousarray(content_frame[:, :width]).reshape(height * bands, width // bands)
+    return cv2.reduce(band_rows, 1, cv2.REDUCE_AVG, dtype=cv2.CV_32F).reshape(height, bands)
+
+
+def estimate_row_shift(last_signature, current_signature, min_overlap=60, max_error=4.0):
+    # 返回 shift，使 current 的第 i 行对应 last 的第 i + shift 行，即向上滚动的像素数（负数为向回滚动）；
+    # 两个签名可以不等长，找不到足够重叠时返回 None
+    n_last = len(last_signature)
+    n_current = len(current_signature)
+    if min(n_last, n_current) < min_overlap:
+        return None
+    last = np.asarray(last_signature, dtype=np.float64).reshape(n_last, -1)
+    current = np.asarray(current_signature, dtype=np.float64).reshape(n_current, -1)
+
+    # corr[lag] = sum(last[i + lag] * current[i])，用 FFT 计算所有 lag 并把各条带相加
+    size = 1 << (n_last + n_current - 1).bit_length()
+    spectrum = np.fft.rfft(last, size, axis=0) * np.conj(np.fft.rfft(current, size, axis=0))
+    circular = np.fft.irfft(spectrum.sum(axis=1), size)
+    lags = np.arange(-(n_current - 1), n_last)
+    corr = circular[lags % size]
+
+    # 重叠区间为 current[lo:hi] 与 last[lo + lag:hi + lag]
+    lo = np.maximum(0, -lags)
+    hi = np.minimum(n_current, n_last - lags)
+    overlaps = hi - lo
+    last_sq = np.concatenate(([0.0], np.cumsum((last * last).sum(axis=1))))
+    current_sq = np.concatenate(([0.0], np.cumsum((current * current).sum(axis=1))))
+    last_energy = last_sq[hi + lags] - last_sq[lo + lags]
+    current_energy = current_sq[hi] - current_sq[lo]
+    error = (last_energy + current_energy - 2.0 * corr) / (np.maximum(overlaps, 1) * last.shape[1])
+
+    error = np.where(overlaps >= min_overlap, error, np.inf)
+    best = int(np.argmin(error))
+    if not np.isfinite(error[best]) or error[best] > max_error * max_error:
+        return None
+    return int(lags[best])
+
+
+def new_content_start_from_shift(shift, content_height):
+    # 向上滚动 shift 像素后，内容区底部 shift 行是新内容
+    if shift is None:
+        return 0  # 与上一帧没有重叠，整个内容区都是新的
+    if shift <= 0:
+        return None  # 静止或向回滚动，没有新内容
+    return content_height - shift
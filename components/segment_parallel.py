@@ -0,0 +1,159 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from .result_cache import read_recorded_frames
+from .segment_sinks import ListSink
+from .video_engine import VideoEngine
+
+
+# 单个长视频按帧区间切块，每块在独立进程中分析，再在接缝处与顺序处理结果对齐。
+#
+# 分析状态只取决于上一张保留帧，所以只要顺序处理在某块中保留的帧也被该块的
+# 子进程保留了，之后两者的结果必然完全一致。合并时从上一块的最后一张保留帧
+# 接着顺序分析，直到与子进程的结果重合，再直接采用子进程之后的结果。
+# 差分估计器在接缝后几帧内就会重合；行签名估计器按累计滚动量保留帧，相位
+# 通常不会重合，接缝会退化为顺序重算，结果仍然一致但没有加速。
+#
+# 子进程只返回保留段的位置（帧号、起始行、meta），不把段的像素传回主进程；主进程合并时
+# 按位置从视频中重新裁剪并立即交给 sink，内存占用与顺序处理相同，不随视频长度增长。
+
+
+def split_frame_range(total_frames, chunks):
+    chunks = max(1, min(chunks, total_frames))
+    bounds = [total_frames * k // chunks for k in range(chunks + 1)]
+    return [(bounds[k], bounds[k + 1]) for k in range(chunks) if bounds[k] < bounds[k + 1]]
+
+
+def read_frame_at(cap, index):
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    ret, frame = cap.read()
+    return frame if ret else None
+
+
+def tail_record(engine):
+    # 引擎跳过但含有未保留新行的帧（见 VideoEngine.remember_tail），转成与保留段相同的记录，没有时返回 None
+    if engine.pending_tail is None:
+        return None
+    new_content_start, i, _, start_y, meta = engine.pending_tail
+    return {"frame_index": i, "start_y": start_y, "meta": meta, "new_content_start": new_content_start}
+
+
+def further_tail(a, b):
+    # 相对同一参考帧的两个尾帧记录中滚动得更远的一个；相同时取较后的 b
+    if a is None or b is None:
+        return b or a
+    return a if a["new_content_start"] < b["new_content_start"] else b
+
+
+def process_chunk(video_path, engine_options, start, end):
+    # 在子进程中运行：把 start 帧当作第一帧，独立分析 [start, end)；
+    # 返回 (保留段的记录, 块末的尾帧记录)，记录为 {"frame_index", "start_y", "meta"}，与结果缓存的记录格式相同
+    engine = VideoEngine(video_path, **engine_options)
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    kept = []
+    for i in range(start, end):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        segment = engine.analyze_frame(i, frame)
+        if segment is not None:
+            kept.append({"frame_index": i, "start_y": frame.shape[0] - segment.shape[0], "meta": engine.last_segment_meta})
+    cap.release()
+    return kept, tail_record(engine)
+
+
+def reconcile_chunk(engine, cap, start, end, last_kept_index, chunk_kept, sink):
+    # 从上一张保留帧接着顺序分析本块，重算出的段直接交给 sink，直到保留的帧与子进程结果重合；
+    # 返回 (之后沿用的子进程记录, 重算的帧数, 重算中保留的帧号, 是否已重合)
+    chunk_indices = {record["frame_index"] for record in chunk_kept}
+    engine.reset_state()
+    reference = read_frame_at(cap, last_kept_index)
+    if reference is None:
+        raise IOError(f"Failed to read frame {last_kept_index} to reconcile the chunk starting at {start}")
+    engine.prime_reference(reference)
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    seam_frames = 0
+    seam_kept = []
+    for i in range(start, end):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        seam_frames += 1
+        segment = engine.analyze_frame(i, frame)
+        if segment is None:
+            continue
+        sink.add_segment(segment, i, engine.last_segment_meta)
+        seam_kept.append(i)
+        if i in chunk_indices:
+            # 状态已经一致，之后直接沿用子进程的结果
+            return [record for record in chunk_kept if record["frame_index"] > i], seam_frames, seam_kept, True
+    return [], seam_frames, seam_kept, False
+
+
+def process_video_parallel(video_path, workers=None, chunks=None, sink=None, **engine_options):
+    # engine_options 与 VideoEngine 相同；自适应抽帧、流水线与调试输出会改变或依赖顺序状态，这里不支持
+    for option in ("adaptive_sampling", "pipelined", "debug_output_dir", "progress_callback"):
+        if engine_options.get(option):
+            raise ValueError(f"{option} is not supported in segment-parallel mode")
+    if sink is None:
+        sink = ListSink()
+    start_time = time.perf_counter()
+
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    max_frames = engine_options.pop("max_frames", None)
+    if max_frames is not None:
+        total_frames = min(total_frames, max_frames)
+    ranges = split_frame_range(total_frames, chunks or workers or 1)
+
+    engine = VideoEngine(video_path, **engine_options)
+    last_kept_index = None
+    tail = None  # 相对最后一张保留帧的尾帧记录，全部处理完后仍存在时补上，与顺序处理的 process() 相同
+    seam_frames = 0
+    frames_kept = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_chunk, video_path, engine_options, start, end) for start, end in ranges]
+            for (start, end), future in zip(ranges, futures):
+                records, chunk_tail = future.result()
+                if last_kept_index is None:
+                    # 第一块从第 0 帧开始，与顺序处理完全相同，不需要对齐
+                    tail = chunk_tail
+                else:
+                    records, reanalyzed, seam_kept, converged = reconcile_chunk(engine, cap, start, end, last_kept_index,
+                                                                                records, sink)
+                    seam_frames += reanalyzed
+                    if seam_kept:
+                        last_kept_index = seam_kept[-1]
+                        frames_kept += len(seam_kept)
+                        tail = None
+                    # 重合后块末的状态与子进程相同；否则整块都已顺序重算，参考帧没有变化时与之前的尾帧比较
+                    tail = chunk_tail if converged else further_tail(tail, tail_record(engine))
+                for record, frame in zip(records, read_recorded_frames(video_path, records)):
+                    sink.add_segment(frame[record["start_y"]:], record["frame_index"], record["meta"])
+                if records:
+                    last_kept_index = records[-1]["frame_index"]
+                    frames_kept += len(records)
+            if tail is not None:
+                for frame in read_recorded_frames(video_path, [tail]):
+                    sink.add_segment(frame[tail["start_y"]:], tail["frame_index"], tail["meta"])
+                frames_kept += 1
+    finally:
+        cap.release()
+
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        "total_frames": total_frames,
+        "frames_read": total_frames,
+        "frames_grabbed": total_frames,
+        "frames_kept": frames_kept,
+        "chunks": len(ranges),
+        "seam_frames": seam_frames,
+        "elapsed": elapsed,
+        "fps": total_frames / elapsed if elapsed > 0 else 0.0,
+    }
+    return sink.close(), stats
@@ -0,0 +1,66 @@
+import os
+
+import cv2
+
+
+# 引擎每保留一段就立即交给 sink，sink 决定这段数据存放在哪里。
+# meta 描述段内的行位置：new_content_top 为新内容开始的行，content_bottom 为底部固定区域开始的行
+class SegmentSink:
+    def add_segment(self, segment, frame_index, meta=None):
+        raise NotImplementedError
+
+    def close(self):
+        return None
+
+
+# 与原来行为一致：所有段保存在内存列表中
+class ListSink(SegmentSink):
+    def __init__(self):
+        self.segments = []
+
+    def add_segment(self, segment, frame_index, meta=None):
+        self.segments.append(segment)
+
+    def close(self):
+        return self.segments
+
+
+# 每段立即写入磁盘，内存中不保留任何段
+class DiskSpillSink(SegmentSink):
+    def __init__(self, output_dir, prefix="segment", ext=".png"):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.ext = ext
+        self.paths = []
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def add_segment(self, segment, frame_index, meta=None):
+        path = os.path.join(self.output_dir, f"{self.prefix}_{len(self.paths) + 1:04d}{self.ext}")
+        if not cv2.imwrite(path, segment):
+            raise IOError(f"Failed to write segment: {path}")
+        self.paths.append(path)
+
+    def close(self):
+        return self.paths
+
+
+# 同时分发给多个 sink，返回各自的结果
+class TeeSink(SegmentSink):
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def add_segment(self, segment, frame_index, meta=None):
+        for sink in self.sinks:
+            sink.add_segment(segment, frame_index, meta)
+
+    def close(self):
+        return [sink.close() for sink in self.sinks]
+
+
+# 每段交给回调，例如转发给界面线程逐段显示
+class CallbackSink(SegmentSink):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def add_segment(self, segment, frame_index, meta=None):
+        self.callback(segment, frame_index, meta)
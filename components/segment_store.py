@@ -0,0 +1,146 @@
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .segment_sinks import SegmentSink
+
+
+def compress_rows(segment, level):
+    return zlib.compress(segment.tobytes(), level)
+
+
+# 紧凑的段存储，只保存裁剪后的行，不引用解码出的整帧。两种方式：
+# - 默认（compression=None）把段复制进预分配的连续行缓冲区（arena），取出时返回视图，不复制也不解码；
+#   缓冲区按块分配，np.empty 得到的内存在写入前不占用物理页，块尾未用的部分几乎没有代价
+# - compression 为 zlib 压缩级别时在内存中无损压缩保存，取出时才解压。聊天截图大片纯色，
+#   级别 1 即可压缩到约 1/14，编码和解码都比 PNG 快数倍；压缩在后台线程中进行（zlib 执行时释放 GIL），
+#   不拖慢分析，排队等待压缩的段数有上限
+# 每段有一个不随删除变化的 key，界面可以用它缓存缩略图。处理线程追加、界面线程读取和删除时由锁保护；
+# 追加结束后调用 close() 释放压缩线程
+class SegmentStore(SegmentSink):
+    def __init__(self, compression=None, chunk_rows=8192, workers=None):
+        self.compression = compression
+        self.chunk_rows = chunk_rows
+        self.executor = None
+        if compression is not None:
+            workers = workers or min(4, os.cpu_count() or 1)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="SegmentStore")
+            self.pending = threading.BoundedSemaphore(workers * 4)
+        self.chunks = []
+        self.chunk_fill = 0
+        self.arena_bytes = 0
+        self.entries = []  # [(key, frame_index, 位置)]，位置为 (块号, 起始行, 行数) 或 (形状, dtype, zlib 压缩任务的 future)
+        self.keys = set()
+        self.next_key = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_frames(cls, frames, **kwargs):
+        store = cls(**kwargs)
+        for index, frame in enumerate(frames):
+            store.append(frame, index)
+        return store
+
+    def add_segment(self, segment, frame_index, meta=None):
+        self.append(segment, frame_index)
+
+    def close(self):
+        # 生产者结束后调用：关闭压缩线程池，已提交的压缩任务照常完成，之后取出、快照不受影响，不能再追加；可以重复调用
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        return self
+
+    def append(self, segment, frame_index=None):
+        if self.compression is not None:
+            self.pending.acquire()  # 压缩跟不上时在这里等待，限制未压缩段占用的内存
+            future = self.executor.submit(compress_rows, np.ascontiguousarray(segment), self.compression)
+            future.add_done_callback(lambda _: self.pending.release())
+            location = (segment.shape, segment.dtype, future)
+        with self.lock:
+            if self.compression is None:
+                location = self.copy_into_arena(segment)
+            key = self.next_key
+            self.next_key += 1
+            self.entries.append((key, frame_index, location))
+            self.keys.add(key)
+            return key
+
+    def copy_into_arena(self, segment):
+        rows = segment.shape[0]
+        chunk = self.chunks[-1] if self.chunks else None
+        if chunk is None or chunk.shape[1:] != segment.shape[1:] or self.chunk_fill + rows > len(chunk):
+            # 当前块放不下（或宽度不同）时开新块，段总在一个块内连续存放
+            chunk = np.empty((max(self.chunk_rows, rows),) + segment.shape[1:], segment.dtype)
+            self.chunks.append(chunk)
+            self.chunk_fill = 0
+        start = self.chunk_fill
+        chunk[start:start + rows] = segment
+        self.chunk_fill += rows
+        self.arena_bytes += segment.nbytes
+        return len(self.chunks) - 1, start, rows
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        with self.lock:
+            location = self.entries[index][2]
+        return self.load(location)
+
+    def loader(self, index):
+        # 返回取出该段的函数，可以交给后台线程解压；之后删除其他段不影响它取出的内容
+        with self.lock:
+            location = self.entries[index][2]
+        return lambda: self.load(location)
+
+    def load(self, location):
+        if self.compression is not None:
+            shape, dtype, future = location
+            return np.frombuffer(zlib.decompress(future.result()), dtype).reshape(shape)
+        chunk, start, rows = location
+        view = self.chunks[chunk][start:start + rows]
+        view.flags.writeable = False  # 视图与存储共享内存
+        return view
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __delitem__(self, index):
+        # arena 中的行不回收，只在 snapshot() 之外不再可见；总量只取决于保留过的段
+        with self.lock:
+            key = self.entries.pop(index)[0]
+            self.keys.discard(key)
+
+    def key(self, index):
+        return self.entries[index][0]
+
+    def frame_index(self, index):
+        return self.entries[index][1]
+
+    def has_key(self, key):
+        return key in self.keys
+
+    def snapshot(self):
+        # 与当前内容相同的只读副本，共享底层数据；之后在原存储中删除或追加不影响副本
+        copy = SegmentStore(chunk_rows=self.chunk_rows)  # 副本只读取，压缩的段共享已提交的压缩任务
+        copy.compression = self.compression
+        with self.lock:
+            copy.chunks = list(self.chunks)
+            copy.chunk_fill = len(self.chunks[-1]) if self.chunks else 0  # 副本追加时总是开新块
+            copy.entries = list(self.entries)
+            copy.keys = set(self.keys)
+            copy.next_key = self.next_key
+            copy.arena_bytes = self.arena_bytes
+        return copy
+
+    @property
+    def nbytes(self):
+        # 实际占用的字节数（arena 中已删除段的行也计入，还在等待压缩的段按原大小计）
+        if self.compression is not None:
+            return sum(len(future.result()) if future.done() else int(np.prod(shape)) * np.dtype(dtype).itemsize
+                       for _, _, (shape, dtype, future) in self.entries)
+        return self.arena_bytes
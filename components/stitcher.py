@@ -0,0 +1,155 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+import cv2
+
+from .scroll_estimator import row_signature, estimate_row_shift
+from .segment_sinks import SegmentSink
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def write_png_rows(path, width, height, row_chunks, compression=3):
+    # 流式写 PNG：逐块压缩行数据并写出 IDAT，内存中只保留当前块。row_chunks 产出 BGR 的 (n, width, 3) 数组
+    compressor = zlib.compressobj(compression)
+    previous_row = np.zeros((1, width * 3), np.uint8)
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        for chunk in row_chunks:
+            rows = np.ascontiguousarray(chunk[:, :, ::-1]).reshape(len(chunk), width * 3)
+            # Up 滤波：每行减去上一行，聊天截图中大片纯色区域压缩效果更好
+            filtered = rows - np.concatenate((previous_row, rows[:-1]))
+            previous_row = rows[-1:]
+            data = np.hstack((np.full((len(rows), 1), 2, np.uint8), filtered))
+            compressed = compressor.compress(data.tobytes())
+            if compressed:
+                f.write(_png_chunk(b"IDAT", compressed))
+        f.write(_png_chunk(b"IDAT", compressor.flush()))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+# 把引擎保留的段按行追加成一张长图。每段只追加新内容行：位置优先用段与已写入内容末尾的
+# 行签名对齐求出，对不上时退回引擎给出的 new_content_top。已写入的行不留在内存中：
+# 单张模式先追加到磁盘上的原始文件，结束时以内存映射方式流式编码成 PNG；分页模式每满一页就写出
+class LongImageStitcher(SegmentSink):
+    def __init__(self, output_path, fixed_top_height=120, fixed_bottom_height=70, page_height=None,
+                 align=True, keep_footer=True, compression=3, signature_bands=4, tail_rows=1024, min_overlap=60):
+        self.output_path = output_path
+        self.fixed_top_height = fixed_top_height
+        self.fixed_bottom_height = fixed_bottom_height
+        self.page_height = page_height  # 为 None 时输出一张长图，否则按该高度分页输出
+        self.align = align
+        self.keep_footer = keep_footer
+        self.compression = compression
+        self.signature_bands = signature_bands
+        self.tail_rows = tail_rows  # 用于对齐的已写入内容末尾行数
+        self.min_overlap = min_overlap
+        self.width = None
+        self.height = 0
+        self.tail_signature = None
+        self.footer = None
+        self.raw_file = None
+        self.raw_path = None
+        self.page = None
+        self.page_fill = 0
+        self.outputs = []
+        self.aligned_segments = 0
+        self.fallback_segments = 0
+
+    def add_segment(self, segment, frame_index, meta=None):
+        if self.width is None:
+            self.open(segment.shape[1])
+        content_bottom = meta["content_bottom"] if meta else segment.shape[0] - self.fixed_bottom_height
+        content = segment[:content_bottom]
+        self.footer = segment[content_bottom:].copy() if self.keep_footer else None
+
+        if self.tail_signature is None:
+            # 第一段带上顶部固定区域，但对齐只使用内容区
+            self.append_rows(content, signature_from=min(self.fixed_top_height, len(content)))
+            return
+
+        new_top = self.find_new_rows(content, meta)
+        if new_top < len(content):
+            self.append_rows(content[new_top:])
+
+    def find_new_rows(self, content, meta):
+        if self.align and len(content) >= self.min_overlap:
+            signature = row_signature(content, self.signature_bands)
+            shift = estimate_row_shift(self.tail_signature, signature, self.min_overlap)
+            if shift is not None:
+                # content 的第 i 行对应已写入末尾的第 i + shift 行
+                self.aligned_segments += 1
+                return int(np.clip(len(self.tail_signature) - shift, 0, len(content)))
+        self.fallback_segments += 1
+        return meta["new_content_top"] if meta else 0
+
+    def open(self, width):
+        self.width = width
+        if self.page_height:
+            self.page = np.empty((self.page_height, width, 3), np.uint8)
+        else:
+            self.raw_path = self.output_path + ".rows.tmp"
+            self.raw_file = open(self.raw_path, "wb")
+
+    def append_rows(self, rows, signature_from=0):
+        if len(rows) == 0:
+            return
+        signature = row_signature(rows[signature_from:], self.signature_bands)
+        if self.tail_signature is None:
+            self.tail_signature = signature
+        else:
+            self.tail_signature = np.concatenate((self.tail_signature, signature))
+        self.tail_signature = self.tail_signature[-self.tail_rows:]
+        self.write_rows(rows)
+
+    def write_rows(self, rows):
+        self.height += len(rows)
+        if self.raw_file is not None:
+            self.raw_file.write(np.ascontiguousarray(rows).tobytes())
+            return
+        start = 0
+        while start < len(rows):
+            count = min(len(rows) - start, self.page_height - self.page_fill)
+            self.page[self.page_fill:self.page_fill + count] = rows[start:start + count]
+            self.page_fill += count
+            start += count
+            if self.page_fill == self.page_height:
+                self.flush_page()
+
+    def flush_page(self):
+        if self.page_fill == 0:
+            return
+        stem, ext = os.path.splitext(self.output_path)
+        path = f"{stem}_page_{len(self.outputs) + 1:04d}{ext or '.png'}"
+        if not cv2.imwrite(path, self.page[:self.page_fill]):
+            raise IOError(f"Failed to write page: {path}")
+        self.outputs.append(path)
+        self.page_fill = 0
+
+    def close(self):
+        if self.width is None:
+            return self.outputs
+        if self.footer is not None and len(self.footer):
+            self.write_rows(self.footer)
+        if self.raw_file is None:
+            self.flush_page()
+            return self.outputs
+
+        self.raw_file.close()
+        rows = np.memmap(self.raw_path, dtype=np.uint8, mode="r", shape=(self.height, self.width, 3))
+        chunk = max(1, (4 * 1024 * 1024) // (self.width * 3))
+        try:
+            write_png_rows(self.output_path, self.width, self.height,
+                           (rows[start:start + chunk] for start in range(0, self.height, chunk)), self.compression)
+        finally:
+            del rows
+            os.remove(self.raw_path)
+        self.outputs.append(self.output_path)
+        return self.outputs
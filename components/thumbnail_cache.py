@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+import cv2
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QImage
+
+
+def render_thumbnail(frame, width, height):
+    # 按比例缩放到 width x height 以内并转为 RGB 的 QImage；只用 OpenCV 和 QImage，可在工作线程中调用
+    frame_height, frame_width = frame.shape[:2]
+    scale = min(width / frame_width, height / frame_height)
+    size = (max(1, round(frame_width * scale)), max(1, round(frame_height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    rgb = cv2.cvtColor(cv2.resize(frame, size, interpolation=interpolation), cv2.COLOR_BGR2RGB)
+    # copy() 让 QImage 持有自己的数据，不再引用 numpy 缓冲区
+    return QImage(rgb.data, rgb.shape[1], rgb.shape[0], rgb.strides[0], QImage.Format_RGB888).copy()
+
+
+# 以帧的稳定 key 为索引的缩略图 LRU 缓存，按占用字节数限制大小
+class ThumbnailCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, key):
+        image = self.entries.get(key)
+        if image is not None:
+            self.entries.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        self.discard(key)
+        self.entries[key] = image
+        self.total_bytes += image.sizeInBytes()
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.sizeInBytes()
+
+    def discard(self, key):
+        image = self.entries.pop(key, None)
+        if image is not None:
+            self.total_bytes -= image.sizeInBytes()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+class ThumbnailSignals(QObject):
+    rendered = pyqtSignal(int, QImage)
+
+
+# 在 QThreadPool 中渲染缩略图，完成后通过信号交回 GUI 线程
+class ThumbnailTask(QRunnable):
+    def __init__(self, key, frame, width, height, signals):
+        super().__init__()
+        self.key = key
+        self.frame = frame  # 数组，或返回数组的函数（在后台线程中解压）
+        self.width = width
+        self.height = height
+        self.signals = signals
+
+    def run(self):
+        frame = self.frame() if callable(self.frame) else self.frame
+        self.signals.rendered.emit(self.key, render_thumbnail(frame, self.width, self.height))
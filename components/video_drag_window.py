@@ -1,12 +1,19 @@
+import importlib
+import threading
+
 from PyQt5.QtWidgets import (QMainWindow, QLabel, QVBoxLayout, QWidget,
-                             QPushButton, QMessageBox, QSizePolicy, QTextEdit)
+                             QPushButton, QMessageBox, QSizePolicy, QTextEdit, QProgressBar)
 from PyQt5.QtCore import Qt, QPropertyAnimation, QEasingCurve
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent
 
 from .fun_progress_bar import FunProgressBar
-from .video_process_thread import VideoProcessThread
-from .image_viewer import ImageViewer
-from components.video_process_thread import VideoProcessThread
+
+
+def preload_processing_modules():
+    # VideoProcessThread 和 ImageViewer 会导入 OpenCV、NumPy，只在拖入文件或开始处理时才导入，窗口可以立即显示
+    for name in ("video_process_thread", "image_viewer"):
+        importlib.import_module(f"{__package__}.{name}")
+
 
 class VideoDragDropWindow(QMainWindow):
     def __init__(self):
@@ -21,6 +28,10 @@ class VideoDragDropWindow(QMainWindow):
         self.init_drag_drop_ui()
 
         self.video_path = None
+        self.thread = None
+        self.image_viewer = None
+        self.progress_bar = None
+        self.log_display = None
 
     def init_drag_drop_ui(self):
         self.drop_area = QLabel("拖曳微信录屏文件到此", self)
@@ -67,6 +78,8 @@ class VideoDragDropWindow(QMainWindow):
         if urls:
             self.video_path = urls[0].toLocalFile()
             self.drop_area.setText("文件已加载，点击开始截图")
+            # 用户点击开始前在后台导入处理模块，点击时不必再等待
+            threading.Thread(target=preload_processing_modules, daemon=True).start()
 
     def process_video(self):
         if not self.video_path:
@@ -86,27 +99,95 @@ class VideoDragDropWindow(QMainWindow):
         self.animation.setEndValue(100)
         self.animation.setEasingCurve(QEasingCurve.OutBounce)
 
+        from .video_process_thread import VideoProcessThread
         self.thread = VideoProcessThread(self.video_path)
         self.thread.progress.connect(self.update_progress)
-        self.thread.finished.connect(self.show_images)
+        self.thread.segment_ready.connect(self.add_segment)
+        self.thread.finished.connect(self.on_processing_finished)
+        self.thread.run_stats.connect(self.show_run_stats)
+        self.thread.failed.connect(self.on_processing_failed)
         
         # 添加日志显示功能
         self.log_display = QTextEdit(self)
         self.log_display.setReadOnly(True)
+        self.log_display.document().setMaximumBlockCount(5000)  # 只保留最近的日志行
         self.layout.addWidget(self.log_display)
-
-        def display_log(message):
-            self.log_display.append(message)
-
-        self.thread.log_message.connect(display_log)
+        self.thread.log_message.connect(self.display_log)
+
+        # 处理进度和取消按钮放在状态栏，切换到图片浏览后仍然可见
+        self.status_progress = QProgressBar(self)
+        self.status_progress.setMaximumWidth(300)
+        self.cancel_button = QPushButton("取消", self)
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        self.statusBar().addPermanentWidget(self.status_progress)
+        self.statusBar().addPermanentWidget(self.cancel_button)
         
         self.thread.start()
 
+    def display_log(self, batch):
+        # 每次收到的是一批日志行，一次性追加；切换到图片浏览后日志只输出到控制台
+        if self.log_display is not None:
+            self.log_display.append(batch)
+
+    def cancel_processing(self):
+        self.cancel_button.setEnabled(False)
+        self.statusBar().showMessage("正在取消…")
+        self.thread.cancel()
+
+    def add_segment(self, segment, frame_index):
+        # 收到第一段就切换到图片浏览；段已由处理线程加入共用的存储，这里只刷新显示
+        if self.image_viewer is None:
+            self.show_images(self.thread.segments)
+            self.image_viewer.set_processing(True)
+        self.image_viewer.segments_added()
+
+    def on_processing_finished(self, segments):
+        self.statusBar().removeWidget(self.status_progress)
+        self.statusBar().removeWidget(self.cancel_button)
+        if self.image_viewer is None:
+            self.show_images(segments if segments is not None else [])  # 没有保留任何段
+        else:
+            self.image_viewer.set_processing(False)
+
+    def on_processing_failed(self, message):
+        # 随后的 finished 会移除进度控件并显示已经保留的段
+        self.statusBar().showMessage("处理失败")
+        QMessageBox.critical(self, "错误", f"处理视频时出错：\n{message}")
+
+    def closeEvent(self, event):
+        # 关闭窗口时停止处理并等待线程释放视频文件
+        if self.thread is not None and self.thread.isRunning():
+            self.thread.cancel()
+            self.thread.wait()
+        super().closeEvent(event)
+
     def update_progress(self, value):
+        self.status_progress.setValue(value)
+        if self.progress_bar is None:
+            return
+        if value == self.progress_bar.value() and self.animation.endValue() == value:
+            return
         self.animation.setStartValue(self.progress_bar.value())
         self.animation.setEndValue(value)
         self.animation.start()
 
+    def show_run_stats(self, stats):
+        # 在状态栏显示本次处理的概况，详细的分阶段耗时在日志中
+        if stats.get("cancelled"):
+            self.statusBar().showMessage(f"已取消，保留 {stats['frames_kept']} 张")
+            return
+        if stats.get("cache") == "hit":
+            self.statusBar().showMessage(f"从缓存载入 {stats['frames_kept']} 张，用时 {stats['elapsed']:.1f} 秒")
+            return
+        self.statusBar().showMessage(
+            f"共 {stats['frames_grabbed']} 帧，保留 {stats['frames_kept']} 张，"
+            f"用时 {stats['elapsed']:.1f} 秒（{stats['fps']:.0f} 帧/秒）")
+
     def show_images(self, frames):
+        # setCentralWidget 会销毁进度条和日志区
+        self.animation.stop()
+        self.progress_bar = None
+        self.log_display = None
+        from .image_viewer import ImageViewer
         self.image_viewer = ImageViewer(frames)
-        self.setCentralWidget(self.image_viewer)
\ No newline at end of file
+        self.setCentralWidget(self.image_viewer)
@@ -0,0 +1,378 @@
+import cv2
+import numpy as np
+import logging
+import threading
+import time
+
+from .content_index import ContentIndex
+from .debug_writer import DebugFrameWriter
+from .frame_sampler import AdaptiveFrameSampler
+from .scroll_estimator import row_signature, estimate_row_shift, new_content_start_from_shift
+from .pipeline import ThreadedFrameSource, ThreadedSink
+from .profiler import DISABLED_PROFILER
+from .segment_sinks import ListSink
+
+
+# 与 Qt 无关的录屏处理核心，GUI 线程与命令行批处理共用
+class VideoEngine:
+    def __init__(self, video_path, fixed_top_height=120, fixed_bottom_height=70, overlap=120, tolerance=100,
+                 debug_output_dir=None, progress_callback=None,
+                 adaptive_sampling=False, max_stride=8, max_frames=None, estimator="diff", signature_bands=4,
+                 debug_mode="kept", debug_every_n=10, debug_max_bytes=256 * 1024 * 1024,
+                 pipelined=False, queue_size=8, gray_analysis=False, analysis_width_scale=0.25, analysis_height_scale=1.0,
+                 profiler=None, dedup=False, dedup_block=32):
+        self.video_path = video_path
+        self.fixed_top_height = fixed_top_height
+        self.fixed_bottom_height = fixed_bottom_height
+        self.overlap = overlap
+        self.tolerance = tolerance  # 容忍度，单位为像素
+        self.debug_output_dir = debug_output_dir  # 为 None 时不输出调试帧
+        self.debug_mode = debug_mode if debug_output_dir else "off"
+        self.debug_every_n = debug_every_n
+        self.debug_max_bytes = debug_max_bytes
+        self.debug_writer = None
+        self.pipelined = pipelined  # 解码、分析、输出分别在独立线程中运行
+        self.queue_size = queue_size
+        self.adaptive_sampling = adaptive_sampling  # 按滚动速度自适应跳帧
+        self.max_stride = max_stride
+        self.max_frames = max_frames  # 为 None 时处理整个视频
+        if estimator not in ("diff", "signature"):
+            raise ValueError(f"Unknown estimator: {estimator}")
+        self.estimator = estimator  # "diff" 为原来的逐像素差分，"signature" 为行签名匹配
+        self.signature_bands = signature_bands
+        # 灰度分析：每帧只转一次灰度并缩小后分析，只有保留的帧才裁剪全分辨率像素。
+        # 聊天文字行横跨整个宽度，所以主要缩小宽度；高度默认不缩放以保持行位置精确
+        self.gray_analysis = gray_analysis
+        self.analysis_width_scale = analysis_width_scale if gray_analysis else 1.0
+        self.analysis_height_scale = analysis_height_scale if gray_analysis else 1.0
+        self.morph_kernel = np.ones((max(1, round(5 * self.analysis_height_scale)),
+                                     max(1, round(5 * self.analysis_width_scale))), np.uint8)
+        self.dedup = dedup  # 跳过内容已经保留过的帧（向回滚动后再滚下来时）
+        self.dedup_block = dedup_block
+        self.progress_callback = progress_callback
+        self.last_progress = None
+        self.profiler = profiler or DISABLED_PROFILER  # 传入 StageProfiler 后统计各阶段耗时
+        self.logger = logging.getLogger('VideoEngine')
+        self.stats = {}
+        self.cancel_event = threading.Event()  # 其他线程调用 cancel() 后处理循环在下一帧停止
+        self.reset_state()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def report_progress(self, value):
+        # 只有百分比变化时才通知，避免每帧都发信号
+        if self.progress_callback is not None and value != self.last_progress:
+            self.last_progress = value
+            with self.profiler.stage("progress_signal"):
+                self.progress_callback(value)
+
+    def read_frames(self, cap, total_frames):
+        for i in range(total_frames):
+            ret, frame = cap.read()
+            if not ret:
+                self.logger.warning("Failed to read frame %d", i)
+                break
+            yield i, frame
+
+    def reset_state(self):
+        # 分析状态只依赖上一张保留帧的内容区
+        self.last_content = None
+        self.last_signature = None
+        self.last_non_empty_content_end = self.fixed_top_height
+        self.frame_count = 0
+        self.last_segment_meta = None
+        self.content_index = ContentIndex(self.dedup_block) if self.dedup else None
+        self.pending_tail = None  # (new_content_start, 帧号, 整帧, start_y, meta)：有未保留的新行但被跳过的帧
+
+    def prepare_analysis_frame(self, content_frame):
+        # 返回用于分析的图像：默认是原始 BGR 内容区，灰度模式下是缩小后的灰度图
+        if not self.gray_analysis:
+            return content_frame
+        gray = cv2.cvtColor(content_frame, cv2.COLOR_BGR2GRAY)
+        if self.analysis_width_scale == 1.0 and self.analysis_height_scale == 1.0:
+            return gray
+        if self.analysis_height_scale == 1.0:
+            # 只缩小宽度时按列抽样：文字行横跨整行，抽样后行的特征不变，且比 INTER_AREA 快得多
+            step = max(1, round(1 / self.analysis_width_scale))
+            return np.ascontiguousarray(gray[:, ::step])
+        size = (max(1, int(gray.shape[1] * self.analysis_width_scale)), max(1, int(gray.shape[0] * self.analysis_height_scale)))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def to_full_rows(self, rows):
+        # 分析坐标中的行号换算回全分辨率
+        if self.analysis_height_scale == 1.0:
+            return int(rows)
+        return int(round(rows / self.analysis_height_scale))
+
+    def remember_reference(self, analysis_frame, signature):
+        if self.estimator == "signature":
+            self.last_signature = signature if signature is not None else row_signature(analysis_frame, self.signature_bands)
+        else:
+            if analysis_frame.base is None:
+                self.last_content = analysis_frame  # 灰度模式下已经是新数组，不再复制
+                return
+            # 原始 BGR 内容区是整帧的视图，只复制内容区的行，不保留整帧
+            with self.profiler.stage("reference_copy", analysis_frame.nbytes):
+                self.last_content = analysis_frame.copy()
+
+    def prime_reference(self, frame):
+        # 把 frame 当作上一张保留帧，用于从视频中间接着分析
+        analysis_frame = self.prepare_analysis_frame(frame[self.fixed_top_height:frame.shape[0] - self.fixed_bottom_height])
+        self.remember_reference(analysis_frame, None)
+        self.last_non_empty_content_end = self.to_full_rows(self.find_non_empty_content_end(analysis_frame)) + self.fixed_top_height
+        self.frame_count = max(self.frame_count, 1)
+
+    def analyze_frame(self, i, frame):
+        # 分析一帧，保留时返回裁剪后的段，否则返回 None
+        fixed_top_height, fixed_bottom_height = self.fixed_top_height, self.fixed_bottom_height
+        overlap = self.overlap
+        profiler = self.profiler
+        # 解码每次返回新的数组且之后不会被修改，不复制整帧；保留时只复制裁剪出的行，
+        # 段不会引用整帧，被丢弃的帧可以立即释放
+        full_frame = frame
+        content_frame = frame[fixed_top_height:frame.shape[0] - fixed_bottom_height]
+        with profiler.stage("prepare"):
+            analysis_frame = self.prepare_analysis_frame(content_frame)
+
+        self.logger.debug("Frame %d - Full size: %s, content size: %s", i, full_frame.shape, content_frame.shape)
+
+        signature = None
+        if self.estimator == "signature":
+            with profiler.stage("signature"):
+                signature = row_signature(analysis_frame, self.signature_bands)
+
+        if self.frame_count == 0:
+            with profiler.stage("content_end"):
+                self.last_non_empty_content_end = self.to_full_rows(self.find_non_empty_content_end(analysis_frame)) + fixed_top_height
+            self.remember_reference(analysis_frame, signature)
+            if self.content_index is not None:
+                with profiler.stage("dedup_index"):
+                    self.content_index.add(content_frame)
+            self.logger.info("Added first frame, content end at: %d", self.last_non_empty_content_end)
+            self.save_debug_frame(full_frame, i, "First", fixed_top_height, fixed_bottom_height, self.last_non_empty_content_end)
+            self.frame_count += 1
+            profiler.count("frames_kept")
+            self.last_segment_meta = {"new_content_top": 0, "content_bottom": full_frame.shape[0] - fixed_bottom_height}
+            return full_frame
+
+        overlap_region = (self.last_non_empty_content_end - overlap, self.last_non_empty_content_end)
+        if self.estimator == "signature":
+            with profiler.stage("shift_estimate"):
+                analysis_start = self.find_new_content_start_by_signature(signature, self.last_signature)
+        else:
+            tolerance = max(1, round(self.tolerance * self.analysis_height_scale))
+            analysis_start = self.find_new_content_start(analysis_frame, self.last_content, tolerance)
+        new_content_start = None if analysis_start is None else self.to_full_rows(analysis_start)
+        self.logger.debug("Frame %d - Overlap region: %s, New content start: %s", i, overlap_region, new_content_start)
+
+        if new_content_start is None:
+            self.logger.debug("Frame %d skipped, no new content detected", i)
+            profiler.count("frames_skipped_no_new_content")
+            self.save_debug_frame(full_frame, i, "Skipped_NoNewContent", fixed_top_height, fixed_bottom_height, self.last_non_empty_content_end, overlap_region)
+            return None
+
+        start_y = max(fixed_top_height, new_content_start + fixed_top_height - overlap)
+        cropped_frame = self.crop_frame(full_frame, start_y)
+        if cropped_frame.shape[0] <= fixed_top_height + overlap:
+            self.logger.debug("Frame %d skipped, not enough new content", i)
+            profiler.count("frames_skipped_short_content")
+            # 新内容不足时由后面保留的帧带上；录屏在这里结束时由 process() 补上，不丢失最后几行
+            self.remember_tail(i, full_frame, start_y, new_content_start, cropped_frame.shape[0])
+            self.save_debug_frame(full_frame, i, "Skipped_ShortContent", fixed_top_height, fixed_bottom_height, self.last_non_empty_content_end, overlap_region, new_content_start + fixed_top_height)
+            return None
+
+        if self.content_index is not None:
+            # 整屏内容都已保留过（向回滚动）时跳过；不更新参考帧，新内容不足一行时会累积到下一帧
+            with profiler.stage("dedup"):
+                duplicate = self.content_index.covers(content_frame)
+            if duplicate:
+                self.logger.debug("Frame %d skipped, content already captured", i)
+                profiler.count("frames_skipped_duplicate")
+                # 跳过的帧底部可能有少量空白或不足一行的新内容，由后面保留的帧带上；之后不再保留任何帧时由 process() 补上
+                if self.content_index.unmatched_rows > self.content_index.max_uncovered_rows:
+                    self.remember_tail(i, full_frame, start_y, new_content_start, cropped_frame.shape[0])
+                self.save_debug_frame(full_frame, i, "Skipped_Duplicate", fixed_top_height, fixed_bottom_height, self.last_non_empty_content_end, overlap_region, new_content_start + fixed_top_height)
+                return None
+
+        with profiler.stage("crop_copy", cropped_frame.nbytes):
+            cropped_frame = cropped_frame.copy()
+        with profiler.stage("content_end"):
+            new_content_end = self.to_full_rows(self.find_non_empty_content_end(analysis_frame[analysis_start:]) + analysis_start)
+        self.last_non_empty_content_end = new_content_end + fixed_top_height
+        self.remember_reference(analysis_frame, signature)
+        if self.content_index is not None:
+            with profiler.stage("dedup_index"):
+                self.content_index.add(content_frame)
+        self.logger.info("Added new frame %d, start_y: %d, content end: %d", self.frame_count + 1, start_y, self.last_non_empty_content_end)
+        self.save_debug_frame(cropped_frame, i, f"Frame_{self.frame_count + 1}", fixed_top_height, fixed_bottom_height, self.last_non_empty_content_end, overlap_region, new_content_start + fixed_top_height)
+        self.frame_count += 1
+        self.pending_tail = None
+        profiler.count("frames_kept")
+        self.last_segment_meta = {
+            "new_content_top": new_content_start + fixed_top_height - start_y,
+            "content_bottom": cropped_frame.shape[0] - fixed_bottom_height,
+        }
+        return cropped_frame
+
+    def remember_tail(self, i, frame, start_y, new_content_start, cropped_height):
+        # 参考帧不变时 new_content_start 可以比较，越小表示滚动得越远：只保留滚动得最远的跳过帧，
+        # 向回滚动后再向前滚动但没有回到最远处就结束时，不会用较近的帧覆盖它
+        if self.pending_tail is not None and self.pending_tail[0] < new_content_start:
+            return
+        meta = {"new_content_top": new_content_start + self.fixed_top_height - start_y,
+                "content_bottom": cropped_height - self.fixed_bottom_height}
+        self.pending_tail = (new_content_start, i, frame, start_y, meta)
+
+    def take_pending_tail(self):
+        # 返回并清除最后一次跳过但含有未保留新行的帧 (段, 帧号, meta)，没有时返回 None。
+        # 帧在解码后不会被修改，跳过时只保留引用，这里才裁剪复制
+        if self.pending_tail is None:
+            return None
+        _, i, frame, start_y, meta = self.pending_tail
+        self.pending_tail = None
+        self.frame_count += 1
+        self.profiler.count("frames_kept")
+        self.logger.info("Added trailing frame %d, start_y: %d", i, start_y)
+        return self.crop_frame(frame, start_y).copy(), i, meta
+
+    def process(self, sink=None):
+        # 保留的段会立即交给 sink；默认的 ListSink 返回段列表
+        if sink is None:
+            sink = ListSink()
+        start_time = time.perf_counter()
+        self.last_progress = None
+        self.reset_state()
+        if self.debug_mode != "off":
+            self.debug_writer = DebugFrameWriter(self.debug_output_dir, mode=self.debug_mode, every_n=self.debug_every_n,
+                                                 max_bytes=self.debug_max_bytes, profiler=self.profiler)
+        cap = cv2.VideoCapture(self.video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.logger.info("Total frames: %d", total_frames)
+        self.logger.info("Using fixed top height: %d, bottom height: %d", self.fixed_top_height, self.fixed_bottom_height)
+
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        sampler = None
+        if self.adaptive_sampling:
+            sampler = AdaptiveFrameSampler(cap, total_frames, self.fixed_top_height, self.fixed_bottom_height, max_stride=self.max_stride)
+            frame_source = iter(sampler)
+        else:
+            frame_source = self.read_frames(cap, total_frames)
+        profiler = self.profiler
+        frame_source = profiler.iterate("decode", frame_source)
+
+        threaded_source = threaded_sink = None
+        if self.pipelined:
+            # 解码线程 -> 有界队列 -> 分析（当前线程，保持对 last_content 的顺序依赖）-> 有界队列 -> 输出线程
+            threaded_source = ThreadedFrameSource(frame_source, self.queue_size)
+            frame_source = iter(threaded_source)
+            sink = threaded_sink = ThreadedSink(sink, self.queue_size, producer_stats=threaded_source.analyze_stats)
+
+        frames_read = 0
+        debug_writer = None
+        try:
+            for i, frame in frame_source:
+                if self.max_frames is not None and i >= self.max_frames:
+                    break
+                if self.cancel_event.is_set():
+                    self.logger.info("Processing cancelled at frame %d", i)
+                    break
+                frames_read += 1
+                with profiler.stage("analyze"):
+                    segment = self.analyze_frame(i, frame)
+                if segment is not None:
+                    with profiler.stage("sink", segment.nbytes):
+                        sink.add_segment(segment, i, self.last_segment_meta)
+                self.report_progress(int((i + 1) / total_frames * 100))
+
+            tail = self.take_pending_tail()
+            if tail is not None:
+                with profiler.stage("sink", tail[0].nbytes):
+                    sink.add_segment(*tail)
+            with profiler.stage("sink_close"):
+                result = sink.close()
+        finally:
+            # 取消或出错时同样停止解码线程、输出线程和调试输出线程池并释放 VideoCapture
+            if threaded_source is not None:
+                threaded_source.close()
+            cap.release()
+            if threaded_sink is not None:
+                threaded_sink.shutdown()
+            if self.debug_writer is not None:
+                debug_writer, self.debug_writer = self.debug_writer, None
+                debug_writer.close()
+        if debug_writer is not None:
+            self.logger.info("Debug frames written: %d (%d bytes, %d dropped)", debug_writer.frames_written,
+                             debug_writer.bytes_written, debug_writer.frames_dropped)
+        elapsed = time.perf_counter() - start_time
+        frames_grabbed = sampler.frames_grabbed if sampler else frames_read
+        self.stats = {
+            "total_frames": total_frames,
+            "frames_read": frames_read,
+            "frames_grabbed": frames_grabbed,
+            "backtracks": sampler.backtracks if sampler else 0,
+            "regrabs": sampler.regrabs if sampler else 0,
+            "frames_kept": self.frame_count,
+            "elapsed": elapsed,
+            "fps": frames_grabbed / elapsed if elapsed > 0 else 0.0,
+            "cancelled": self.cancelled,
+        }
+        if threaded_source is not None:
+            self.stats["pipeline"] = {
+                "decode": threaded_source.decode_stats.as_dict(),
+                "analyze": threaded_source.analyze_stats.as_dict(),
+                "sink": sink.stats.as_dict(),
+            }
+        if profiler.enabled:
+            self.stats["profile"] = profiler.summary()
+        self.logger.info("Processing completed. Total frames captured: %d", self.frame_count)
+        return result
+
+    def find_new_content_start(self, current_frame, last_frame, tolerance):
+        with self.profiler.stage("absdiff"):
+            diff = cv2.absdiff(current_frame, last_frame)
+            gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY) if diff.ndim == 3 else diff
+            _, thresh = cv2.threshold(gray_diff, 30, 255, cv2.THRESH_BINARY)
+
+        # 使用形态学操作来减少噪声
+        with self.profiler.stage("morphology"):
+            thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, self.morph_kernel)
+
+        row_sums = np.sum(thresh, axis=1)
+        new_content_rows = np.where(row_sums > thresh.shape[1] * 0.1)[0]  # 10% 的列有变化
+
+        if len(new_content_rows) > 0:
+            # 找到第一个连续的新内容区域
+            for i in range(len(new_content_rows) - 1):
+                if new_content_rows[i+1] - new_content_rows[i] > tolerance:
+                    return new_content_rows[i]
+            return new_content_rows[0]
+        return None
+
+    def find_new_content_start_by_signature(self, current_signature, last_signature):
+        # 通过行签名互相关求出精确的滚动像素数，再换算成新内容起始行
+        shift = estimate_row_shift(last_signature, current_signature, min_overlap=max(8, round(60 * self.analysis_height_scale)))
+        return new_content_start_from_shift(shift, len(current_signature))
+
+    def save_debug_frame(self, frame, frame_number, status, fixed_top_height, fixed_bottom_height, content_end, overlap_region=None, new_content_start=None):
+        # 只提交给后台写入器，不在分析循环中绘制或编码
+        if self.debug_writer is None:
+            return
+        kept = not status.startswith("Skipped")
+        with self.profiler.stage("debug_submit"):
+            self.debug_writer.submit(frame, frame_number, status, kept, fixed_top_height, fixed_bottom_height,
+                                     content_end, overlap_region, new_content_start)
+
+    def crop_frame(self, frame, start_y):
+        return frame[start_y:, :]
+
+    def find_non_empty_content_end(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        _, binary = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
+        non_zero_rows = np.where(np.sum(binary, axis=1) > frame.shape[1] * 0.05)[0]  # 忽略几乎为空的行
+        return non_zero_rows[-1] if len(non_zero_rows) > 0 else 0
+
@@ -1,23 +1,122 @@
-import sys
-import os
-import time
+import ast
 import importlib
+import os
+import sys
+import traceback
+
+from PyQt5.QtCore import QFileSystemWatcher, QTimer
+from PyQt5.QtWidgets import QApplication
+
 import app
 
-def check_for_file_changes():
-    last_mtime = os.path.getmtime('app.py')
-    while True:
-        time.sleep(1)  # 每秒检查一次
-        current_mtime = os.path.getmtime('app.py')
-        if current_mtime != last_mtime:
-            print("检测到文件变化，正在重新加载...")
-            importlib.reload(app)
-            last_mtime = current_mtime
-            return True
-    return False
+ROOT = os.path.dirname(os.path.abspath(__file__))
+WATCH_DIRS = [ROOT, os.path.join(ROOT, "components")]
+
+
+def source_files():
+    return sorted(os.path.join(directory, name) for directory in WATCH_DIRS
+                  for name in os.listdir(directory) if name.endswith(".py"))
+
+
+def local_imports(module):
+    # 模块源码（磁盘上的新版本）中导入的本项目模块名，包括函数内的延迟导入
+    with open(module.__file__, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    package = module.__name__.rpartition(".")[0]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = package if node.level else ""
+            if node.module:
+                base = f"{base}.{node.module}" if base else node.module
+            names.add(base)
+            names.update(f"{base}.{alias.name}" for alias in node.names)  # from . import x 导入的是子模块
+    return names
+
+
+def project_modules():
+    # 已导入的本项目模块：components.* 按依赖关系排序，被导入的模块在前，重新加载使用者时
+    # from ... import 取到的已经是新的类和函数；app 依赖窗口类，放在最后
+    loaded = {name: module for name, module in sys.modules.items() if name.startswith("components.")}
+    order = []
+    visited = set()
+
+    def visit(name):
+        if name in visited:
+            return  # 已排好或处于循环导入中
+        visited.add(name)
+        for dependency in sorted(local_imports(loaded[name]) & loaded.keys()):
+            visit(dependency)
+        order.append(name)
+
+    for name in sorted(loaded):
+        visit(name)
+    modules = [loaded[name] for name in order]
+    if "app" in sys.modules:
+        modules.append(sys.modules["app"])
+    return modules
+
+
+# 监视 app.py 和 components/ 下的源文件（由文件系统事件驱动，不轮询），保存后原地重新加载已导入的模块
+# 并重建窗口；QApplication 只创建一次。还没有导入的模块（例如处理模块）下次导入时自然是新代码
+class Reloader:
+    def __init__(self, debounce_ms=300):
+        self.window = None
+        self.files = []
+        self.watcher = QFileSystemWatcher()
+        self.watcher.fileChanged.connect(self.schedule_reload)
+        self.watcher.directoryChanged.connect(self.directory_changed)
+        # 编辑器保存一次可能产生多个事件，合并成一次重新加载
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.reload)
+        self.watch()
+
+    def watch(self):
+        # 以“写临时文件再改名”方式保存的编辑器会让原文件从监视列表中消失，每次重新加载后补上
+        self.files = source_files()
+        watched = set(self.watcher.files() + self.watcher.directories())
+        missing = [path for path in WATCH_DIRS + self.files if path not in watched]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def schedule_reload(self, path):
+        self.timer.start()
+
+    def directory_changed(self, path):
+        # 只关心新增、删除或改名的源文件，忽略 __pycache__ 等其他变化
+        if source_files() != self.files:
+            self.timer.start()
+
+    def show_window(self):
+        self.window = app.create_window()
+        self.window.show()
+
+    def reload(self):
+        self.watch()
+        print("检测到文件变化，正在重新加载...")
+        try:
+            for module in project_modules():
+                importlib.reload(module)
+        except Exception:
+            traceback.print_exc()  # 保留当前窗口，修正后再次保存即可
+            return
+        old_window = self.window
+        self.show_window()
+        if old_window is not None:
+            old_window.close()  # 正在处理时会先取消并等待处理线程结束
+            old_window.deleteLater()
+
+
+def main():
+    qt_app = QApplication(sys.argv)
+    reloader = Reloader()
+    reloader.show_window()
+    return qt_app.exec_()
+
 
 if __name__ == "__main__":
-    while True:
-        app.run()
-        if not check_for_file_changes():
-            break
\ No newline at end of file
+    sys.exit(main())